@@ -0,0 +1,70 @@
+import os
+import math
+from typing import Optional
+
+from metrics import SUBMISSIONS_ACTIVE, SUBMISSIONS_REJECTED
+
+# Quick evaluations running at once in this process before new submissions get 429
+MAX_ACTIVE_SUBMISSIONS = int(os.getenv("MAX_ACTIVE_SUBMISSIONS", "64"))
+# Queued final evaluations above which new submissions get 429 (0 disables the check)
+MAX_QUEUED_FINAL_EVALS = int(os.getenv("MAX_QUEUED_FINAL_EVALS", "0"))
+# Bounds for the Retry-After sent with a 429, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class AdmissionController:
+    """
+    Bounds the evaluation backlog instead of queueing without limit.
+
+    ``admit`` takes a slot or returns how many seconds the client should
+    wait, estimated from how long recent evaluations took. Only used from
+    the event loop, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        max_active: int = MAX_ACTIVE_SUBMISSIONS,
+        max_queued_final: int = MAX_QUEUED_FINAL_EVALS,
+    ):
+        self.max_active = max_active
+        self.max_queued_final = max_queued_final
+        self.active = 0
+        # Moving average of evaluation time, seeded with a rough guess
+        self.average_seconds = 5.0
+
+    def retry_after(self, waiting: int = 1) -> int:
+        """Seconds until roughly ``waiting`` evaluations have finished"""
+        rounds = math.ceil(waiting / max(1, self.max_active))
+        seconds = math.ceil(self.average_seconds * rounds)
+        return min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, seconds))
+
+    def admit(self, queued_final: int = 0) -> Optional[int]:
+        """
+        Take an evaluation slot
+
+        Args:
+            queued_final: Final evaluations currently waiting for a worker
+
+        Returns:
+            None when admitted, otherwise the Retry-After in seconds
+        """
+        if self.active >= self.max_active:
+            SUBMISSIONS_REJECTED.inc(reason="active")
+            return self.retry_after(self.active - self.max_active + 1)
+        if self.max_queued_final and queued_final >= self.max_queued_final:
+            SUBMISSIONS_REJECTED.inc(reason="final_backlog")
+            return self.retry_after(queued_final - self.max_queued_final + 1)
+        self.active += 1
+        SUBMISSIONS_ACTIVE.set(self.active)
+        return None
+
+    def release(self, duration: Optional[float] = None):
+        """Free a slot, folding the evaluation time into the estimate"""
+        self.active -= 1
+        SUBMISSIONS_ACTIVE.set(self.active)
+        if duration is not None:
+            self.average_seconds = 0.8 * self.average_seconds + 0.2 * duration
+
+
+admission = AdmissionController()
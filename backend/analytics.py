@@ -0,0 +1,252 @@
+"""
+Per-question outcomes and question difficulty.
+
+The outcome of every question in every evaluation (predicted and expected
+label, correctness, latency) is stored in ``question_outcomes``. The same
+write updates running aggregates per question (``question_stats``) and per
+question and predicted label (``question_predictions``), so difficulty and
+confusion matrices are read from a few hundred rows instead of recomputed.
+Outcomes are queued and written in batches by a background thread, like
+the evaluation log, so evaluations never wait for the database.
+"""
+import os
+import time
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import connection, transaction
+from evallog import EvaluationLogWriter
+from questions import normalize_label, question_id
+
+# Evaluations written per batch at most
+OUTCOME_BATCH_SIZE = int(os.getenv("OUTCOME_BATCH_SIZE", "64"))
+# Seconds an evaluation's outcomes may wait before they are written
+OUTCOME_FLUSH_INTERVAL = float(os.getenv("OUTCOME_FLUSH_INTERVAL", "1.0"))
+# Answers a question needs before it can be flagged as suspect
+ANALYTICS_MIN_ANSWERS = int(os.getenv("ANALYTICS_MIN_ANSWERS", "5"))
+
+
+def base_version(question_set_version: str) -> str:
+    """
+    Version of the whole CSV a question set was taken from
+
+    Heads, samples and rests of a set (``<version>:20``, ``<version>:sample60``)
+    hold the same questions, so their outcomes are counted together.
+    """
+    return question_set_version.split(":", 1)[0]
+
+
+def make_outcomes(
+    results: Dict[str, Any], name: Optional[str], question_set_version: str
+) -> Dict[str, Any]:
+    """
+    Build the outcome record of one evaluation
+
+    Questions the model did not answer say nothing about the question and
+    are left out.
+    """
+    outcomes = []
+    for result in results.values():
+        predicted = normalize_label(result.get("classification"))
+        if predicted == "?" or "expected" not in result:
+            continue
+        outcomes.append(
+            {
+                "question_id": question_id(result["question"]),
+                "question": result["question"],
+                "predicted": predicted,
+                "expected": normalize_label(result["expected"]),
+                "correct": int(result["correct"]),
+                "latency": result.get("latency"),
+            }
+        )
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "name": name,
+        "question_set_version": base_version(question_set_version),
+        "outcomes": outcomes,
+    }
+
+
+def save_outcomes(records: List[Dict[str, Any]]):
+    """Store the outcomes of several evaluations and add them to the aggregates, in one transaction"""
+    rows = []
+    stats: Dict[Tuple[str, str], List[Any]] = {}
+    predictions: Dict[Tuple[str, str, str], int] = {}
+    for record in records:
+        version = record["question_set_version"]
+        for outcome in record["outcomes"]:
+            qid = outcome["question_id"]
+            latency = outcome["latency"]
+            rows.append(
+                (
+                    version,
+                    qid,
+                    record["name"],
+                    outcome["predicted"],
+                    outcome["expected"],
+                    outcome["correct"],
+                    latency,
+                    record["timestamp"],
+                )
+            )
+            # [question, expected, answered, correct, latency_sum, latency_count]
+            entry = stats.setdefault(
+                (version, qid), [outcome["question"], outcome["expected"], 0, 0, 0.0, 0]
+            )
+            entry[2] += 1
+            entry[3] += outcome["correct"]
+            if latency is not None:
+                entry[4] += latency
+                entry[5] += 1
+            key = (version, qid, outcome["predicted"])
+            predictions[key] = predictions.get(key, 0) + 1
+    if not rows:
+        return
+
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT INTO question_outcomes (
+                question_set_version, question_id, name, predicted, expected, correct, latency,
+                created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        conn.executemany(
+            """
+            INSERT INTO question_stats (
+                question_set_version, question_id, question, expected, answered, correct,
+                latency_sum, latency_count
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (question_set_version, question_id) DO UPDATE SET
+                answered = answered + excluded.answered,
+                correct = correct + excluded.correct,
+                latency_sum = latency_sum + excluded.latency_sum,
+                latency_count = latency_count + excluded.latency_count
+            """,
+            [(version, qid, *entry) for (version, qid), entry in stats.items()],
+        )
+        conn.executemany(
+            """
+            INSERT INTO question_predictions (question_set_version, question_id, predicted, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (question_set_version, question_id, predicted) DO UPDATE SET
+                count = count + excluded.count
+            """,
+            [(*key, count) for key, count in predictions.items()],
+        )
+
+
+def get_question_analytics(
+    question_set_version: str, min_answers: int = ANALYTICS_MIN_ANSWERS
+) -> Dict[str, Any]:
+    """
+    Difficulty per question, accuracy per label and the confusion matrix
+
+    A question is flagged as suspect once it has ``min_answers`` answers
+    and the label predicted most often is not its expected label: most
+    solutions agree on another answer, so the expected label may be wrong
+    or the question ambiguous.
+
+    Args:
+        question_set_version: Version of the question CSV
+        min_answers: Answers a question needs before it can be flagged
+
+    Returns:
+        Questions (hardest first), labels and ``confusion[expected][predicted]`` counts
+    """
+    version = base_version(question_set_version)
+    with connection() as conn:
+        stats = conn.execute(
+            """
+            SELECT question_id, question, expected, answered, correct, latency_sum, latency_count
+            FROM question_stats WHERE question_set_version = ?
+            """,
+            (version,),
+        ).fetchall()
+        predictions = conn.execute(
+            """
+            SELECT question_id, predicted, count FROM question_predictions
+            WHERE question_set_version = ?
+            """,
+            (version,),
+        ).fetchall()
+
+    predicted_by_question: Dict[str, Dict[str, int]] = {}
+    for qid, predicted, count in predictions:
+        predicted_by_question.setdefault(qid, {})[predicted] = count
+
+    questions = []
+    labels: Dict[str, Dict[str, Any]] = {}
+    confusion: Dict[str, Dict[str, int]] = {}
+    for qid, question, expected, answered, correct, latency_sum, latency_count in stats:
+        counts = predicted_by_question.get(qid, {})
+        top = max(counts, key=counts.get) if counts else None
+        questions.append(
+            {
+                "id": qid,
+                "question": question,
+                "expected": expected,
+                "answered": answered,
+                "correct": correct,
+                "accuracy": correct / answered if answered else None,
+                "mean_latency": latency_sum / latency_count if latency_count else None,
+                "predictions": counts,
+                "suspect": answered >= min_answers and top != expected,
+            }
+        )
+
+        label = labels.setdefault(expected, {"answered": 0, "correct": 0})
+        label["answered"] += answered
+        label["correct"] += correct
+        row = confusion.setdefault(expected, {})
+        for predicted, count in counts.items():
+            row[predicted] = row.get(predicted, 0) + count
+
+    for label in labels.values():
+        label["accuracy"] = label["correct"] / label["answered"] if label["answered"] else None
+    questions.sort(key=lambda q: (q["accuracy"] if q["accuracy"] is not None else 1.0, -q["answered"]))
+
+    return {
+        "question_set_version": version,
+        "questions": questions,
+        "labels": labels,
+        "confusion": confusion,
+    }
+
+
+class OutcomeWriter(EvaluationLogWriter):
+    """
+    Background writer for question outcomes.
+
+    Reuses the evaluation log writer's queue and batching thread; each
+    batch goes to the database in one transaction instead of to a log
+    segment. A batch that fails to write is kept and retried.
+    """
+
+    def __init__(
+        self, batch_size: int = OUTCOME_BATCH_SIZE, flush_interval: float = OUTCOME_FLUSH_INTERVAL
+    ):
+        super().__init__(batch_size=batch_size, flush_interval=flush_interval)
+
+    def _flush(self) -> bool:
+        batch = self._pending[: self.batch_size]
+        try:
+            save_outcomes(batch)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Question outcome write failed, keeping {len(self._pending)} evaluations: {e}")
+            time.sleep(self.flush_interval)
+            return False
+        del self._pending[: len(batch)]
+        self.written += len(batch)
+        self.batches += 1
+        return True
+
+
+outcome_writer = OutcomeWriter()
@@ -0,0 +1,60 @@
+"""
+Async versions of the data-access functions in database.py, jobs.py and quota.py.
+
+Each function runs its blocking SQLite work on the database threads
+(db.run_in_db_thread), so route handlers, the worker and the evaluation
+pipeline never stall the event loop on a query or a lock wait.
+"""
+import functools
+from typing import Any, Awaitable, Callable
+
+import database
+import jobs
+import quota
+from broadcast import broadcaster
+from db import run_in_db_thread
+
+
+def _off_loop(fn: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_thread(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def _notifies(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Wake the leaderboard stream once the write has committed"""
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        result = await fn(*args, **kwargs)
+        broadcaster.notify()
+        return result
+
+    return wrapper
+
+
+init_db = _off_loop(database.init_db)
+save_submission = _notifies(_off_loop(database.save_submission))
+update_submission = _notifies(_off_loop(database.update_submission))
+save_provisional_score = _notifies(_off_loop(database.save_provisional_score))
+get_leaderboard = _off_loop(database.get_leaderboard)
+get_top_three = _off_loop(database.get_top_three)
+get_latest_unscored_submissions = _off_loop(database.get_latest_unscored_submissions)
+get_best_final_scores = _off_loop(database.get_best_final_scores)
+get_latest_tries = _off_loop(database.get_latest_tries)
+get_final_standings = _off_loop(database.get_final_standings)
+get_leaderboard_version = _off_loop(database.get_leaderboard_version)
+get_evaluation_result = _off_loop(database.get_evaluation_result)
+save_evaluation_result = _off_loop(database.save_evaluation_result)
+
+enqueue_final_eval = _off_loop(jobs.enqueue_final_eval)
+claim_job = _off_loop(jobs.claim_job)
+renew_lease = _off_loop(jobs.renew_lease)
+complete_job = _off_loop(jobs.complete_job)
+fail_job = _off_loop(jobs.fail_job)
+job_counts = _off_loop(jobs.job_counts)
+
+reserve_try = _off_loop(quota.reserve_try)
+release_try = _off_loop(quota.release_try)
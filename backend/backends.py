@@ -0,0 +1,453 @@
+import io
+import abc
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from models import OpenAIResponse, OpenAIPackedResponse
+from ratelimit import rate_limiter, estimate_tokens, COMPLETION_TOKENS
+from scheduler import scheduler, lane_priority
+from usage import record_usage as record_evaluation_usage
+
+LABELS = ["Sticos", "SupportAI", "innsiktsmodulen"]
+
+
+def build_messages(system_prompt: str, question: str) -> List[Dict[str, str]]:
+    """
+    Chat messages for classifying one question with the user's prompt
+
+    The prompt is the system message and comes first, unchanged, so every
+    request of an evaluation shares it as a prefix and upstream prompt
+    caching can reuse it. Only the short user message varies.
+    """
+    return [
+        {"role": "system", "content": f"{system_prompt}"},
+        {"role": "user", "content": f"{question}"},
+    ]
+
+
+def build_packed_messages(
+    system_prompt: str, questions: List[Tuple[int, str]]
+) -> List[Dict[str, str]]:
+    """Chat messages for classifying several questions, identified by id, in one call"""
+    numbered = "\n".join(f"{question_id}: {question}" for question_id, question in questions)
+    return [
+        {"role": "system", "content": f"{system_prompt}"},
+        {
+            "role": "user",
+            "content": (
+                "Classify each of the following questions separately. "
+                "Return exactly one answer per question id.\n\n" + numbered
+            ),
+        },
+    ]
+
+
+def response_format_schema() -> Dict:
+    """Structured-output response format for OpenAIResponse as plain JSON"""
+    schema = OpenAIResponse.model_json_schema()
+    schema["additionalProperties"] = False
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "OpenAIResponse", "strict": True, "schema": schema},
+    }
+
+
+class ClassifierBackend(abc.ABC):
+    """
+    Interface for anything that can classify questions with a system prompt.
+
+    Subclasses implement ``classify``. ``classify_many`` defaults to running
+    ``classify`` for every request; bulk backends override it to submit all
+    requests as one job.
+    """
+
+    name = "base"
+    # Backends with the same source give the same answers and share cached ones
+    cache_source = "base"
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+        """Count one upstream request and its token usage, also against the current evaluation"""
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        record_evaluation_usage(prompt_tokens, completion_tokens, cached_tokens)
+
+    @abc.abstractmethod
+    async def classify(self, system_prompt: str, question: str) -> str:
+        """Classify one question with the given system prompt"""
+
+    async def classify_packed(
+        self, system_prompt: str, questions: List[Tuple[int, str]]
+    ) -> Dict[int, str]:
+        """
+        Classify several (id, question) pairs, ideally in a single request
+
+        Returns:
+            Classification per question id. Ids missing from the result
+            were not answered and should be retried on their own.
+        """
+        labels = await asyncio.gather(
+            *(self.classify(system_prompt, question) for _, question in questions)
+        )
+        return {question_id: label for (question_id, _), label in zip(questions, labels)}
+
+    async def classify_many(
+        self, requests: List[Tuple[str, str]]
+    ) -> List[Optional[str]]:
+        """
+        Classify many (system prompt, question) pairs
+
+        Returns:
+            One classification per request, in order, or None where it failed
+        """
+
+        async def _one(system_prompt: str, question: str) -> Optional[str]:
+            try:
+                async with scheduler.slot():
+                    return await self.classify(system_prompt, question)
+            except Exception as e:
+                print(f"Classification failed: {e}")
+                return None
+
+        return await asyncio.gather(*(_one(p, q) for p, q in requests))
+
+
+class ChatBackend(ClassifierBackend):
+    """Live backend: one structured-output chat completion per question"""
+
+    name = "chat"
+    cache_source = "openai"
+
+    def __init__(self, client, model: str, temperature: float, seed: int):
+        super().__init__()
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.seed = seed
+
+    def _record_response_usage(self, response):
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.record_usage(
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+            getattr(details, "cached_tokens", 0) or 0,
+        )
+
+    @staticmethod
+    def _cache_hint(system_prompt: str) -> Dict[str, str]:
+        # Routes every request with the same prompt prefix to the same prompt cache
+        key = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:32]
+        return {"prompt_cache_key": key}
+
+    async def classify(self, system_prompt: str, question: str) -> str:
+        # All model traffic in the process shares one RPM/TPM budget
+        await rate_limiter.acquire(estimate_tokens(system_prompt, question), lane_priority())
+
+        response = await self.client.beta.chat.completions.parse(
+            model=self.model,
+            messages=build_messages(system_prompt, question),
+            response_format=OpenAIResponse,
+            temperature=self.temperature,
+            seed=self.seed,
+            extra_body=self._cache_hint(system_prompt),
+        )
+        self._record_response_usage(response)
+        return json.loads(response.choices[0].message.content)["response"]
+
+    async def classify_packed(
+        self, system_prompt: str, questions: List[Tuple[int, str]]
+    ) -> Dict[int, str]:
+        await rate_limiter.acquire(
+            estimate_tokens(system_prompt, *(question for _, question in questions))
+            + COMPLETION_TOKENS * len(questions),
+            lane_priority(),
+        )
+
+        response = await self.client.beta.chat.completions.parse(
+            model=self.model,
+            messages=build_packed_messages(system_prompt, questions),
+            response_format=OpenAIPackedResponse,
+            temperature=self.temperature,
+            seed=self.seed,
+            extra_body=self._cache_hint(system_prompt),
+        )
+        self._record_response_usage(response)
+
+        requested = {question_id for question_id, _ in questions}
+        answers: Dict[int, str] = {}
+        for answer in json.loads(response.choices[0].message.content)["answers"]:
+            if answer["id"] in requested and answer["id"] not in answers:
+                answers[answer["id"]] = answer["response"]
+        return answers
+
+
+class BatchBackend(ClassifierBackend):
+    """
+    Bulk backend using the OpenAI Batch API.
+
+    ``classify_many`` writes every request as one line of a JSONL file,
+    uploads it, creates a batch and polls until it finishes. Results are
+    mapped back to requests through their ``custom_id``.
+    """
+
+    name = "batch"
+    cache_source = "openai"
+
+    # Request limit of a single batch file
+    MAX_REQUESTS_PER_BATCH = 50000
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        temperature: float,
+        seed: int,
+        poll_interval: float = 10.0,
+        completion_window: str = "24h",
+    ):
+        super().__init__()
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.seed = seed
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    def build_batch_file(self, requests: List[Tuple[str, str]]) -> bytes:
+        """Serialize requests as Batch API JSONL, one chat completion per line"""
+        lines = []
+        for i, (system_prompt, question) in enumerate(requests):
+            lines.append(
+                json.dumps(
+                    {
+                        "custom_id": f"request-{i}",
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": {
+                            "model": self.model,
+                            "messages": build_messages(system_prompt, question),
+                            "response_format": response_format_schema(),
+                            "temperature": self.temperature,
+                            "seed": self.seed,
+                        },
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    @staticmethod
+    def parse_output(text: str) -> Dict[str, str]:
+        """Map custom_id to classification from a batch output file"""
+        classifications = {}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                continue
+            content = response["body"]["choices"][0]["message"]["content"]
+            classifications[record["custom_id"]] = json.loads(content)["response"]
+        return classifications
+
+    async def _run_batch(self, requests: List[Tuple[str, str]]) -> Dict[str, str]:
+        upload = await self.client.files.create(
+            file=("batch.jsonl", io.BytesIO(self.build_batch_file(requests))),
+            purpose="batch",
+        )
+        batch = await self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window,
+        )
+        print(f"Submitted batch {batch.id} with {len(requests)} requests")
+
+        while batch.status not in {"completed", "failed", "expired", "cancelled"}:
+            await asyncio.sleep(self.poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+
+        if not batch.output_file_id:
+            print(f"Batch {batch.id} ended with status {batch.status} and no output")
+            return {}
+
+        output = await self.client.files.content(batch.output_file_id)
+        return self.parse_output(output.text)
+
+    async def classify(self, system_prompt: str, question: str) -> str:
+        (classification,) = await self.classify_many([(system_prompt, question)])
+        if classification is None:
+            raise RuntimeError("Batch request failed")
+        return classification
+
+    async def classify_many(
+        self, requests: List[Tuple[str, str]]
+    ) -> List[Optional[str]]:
+        results: List[Optional[str]] = []
+        for start in range(0, len(requests), self.MAX_REQUESTS_PER_BATCH):
+            chunk = requests[start : start + self.MAX_REQUESTS_PER_BATCH]
+            classifications = await self._run_batch(chunk)
+            results.extend(classifications.get(f"request-{i}") for i in range(len(chunk)))
+        return results
+
+
+class FakeBackend(ClassifierBackend):
+    """
+    Deterministic offline backend for tests and benchmarks.
+
+    Each (prompt, question) pair always gets the same label. With an
+    ``answer_key`` the expected label is returned for a stable fraction of
+    questions, so better "prompts" can be simulated through ``accuracy``
+    (by default derived from the prompt itself). ``drop_rate`` leaves that
+    fraction of ids out of packed answers to exercise the fallback path.
+    """
+
+    name = "fake"
+    cache_source = "fake"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        answer_key: Optional[Dict[str, str]] = None,
+        accuracy: Optional[float] = None,
+        drop_rate: float = 0.0,
+    ):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.answer_key = answer_key or {}
+        self.accuracy = accuracy
+        self.drop_rate = drop_rate
+
+    async def _respond(self, messages: List[Dict[str, str]], answers: int):
+        """Simulate latency and count tokens the way a live request would"""
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        self.record_usage(
+            estimate_tokens(*(m["content"] for m in messages)) - COMPLETION_TOKENS,
+            COMPLETION_TOKENS * answers,
+        )
+
+    @staticmethod
+    def _fraction(*parts: str) -> float:
+        digest = hashlib.sha256("\0".join(parts).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") / 2**64
+
+    def label_for(self, system_prompt: str, question: str) -> str:
+        expected = self.answer_key.get(question.strip())
+        if expected is not None:
+            accuracy = self.accuracy
+            if accuracy is None:
+                accuracy = 0.2 + 0.7 * self._fraction(system_prompt)
+            if self._fraction(system_prompt, question, "correct") < accuracy:
+                return expected
+            wrong = [label for label in LABELS if label.lower() != expected.lower()]
+            return wrong[int(self._fraction(system_prompt, question) * len(wrong))]
+        return LABELS[int(self._fraction(system_prompt, question) * len(LABELS))]
+
+    async def classify(self, system_prompt: str, question: str) -> str:
+        await self._respond(build_messages(system_prompt, question), 1)
+        return self.label_for(system_prompt, question)
+
+    async def classify_packed(
+        self, system_prompt: str, questions: List[Tuple[int, str]]
+    ) -> Dict[int, str]:
+        await self._respond(build_packed_messages(system_prompt, questions), len(questions))
+        return {
+            question_id: self.label_for(system_prompt, question)
+            for question_id, question in questions
+            if self._fraction(system_prompt, question, "drop") >= self.drop_rate
+        }
+
+
+class LocalBatchClient:
+    """
+    In-process stand-in for the files and batches parts of AsyncOpenAI.
+
+    Batches are answered by a FakeBackend, so BatchBackend can be exercised
+    offline end to end, including JSONL serialization and custom_id mapping.
+    Used by LocalBatchBackend (BULK_BACKEND=local-batch).
+    """
+
+    def __init__(self, backend: Optional[FakeBackend] = None):
+        self.backend = backend or FakeBackend()
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, object] = {}
+        self.files = self._Files(self)
+        self.batches = self._Batches(self)
+
+    class _Files:
+        def __init__(self, outer: "LocalBatchClient"):
+            self.outer = outer
+
+        async def create(self, file, purpose: str):
+            _, handle = file
+            file_id = f"file-{len(self.outer._files)}"
+            self.outer._files[file_id] = handle.read()
+            return _Record(id=file_id)
+
+        async def content(self, file_id: str):
+            return _Record(text=self.outer._files[file_id].decode("utf-8"))
+
+    class _Batches:
+        def __init__(self, outer: "LocalBatchClient"):
+            self.outer = outer
+
+        async def create(self, input_file_id: str, endpoint: str, completion_window: str):
+            outer = self.outer
+            lines = []
+            for line in outer._files[input_file_id].decode("utf-8").splitlines():
+                request = json.loads(line)
+                system_prompt, question = (m["content"] for m in request["body"]["messages"])
+                label = await outer.backend.classify(system_prompt, question)
+                body = {"choices": [{"message": {"content": json.dumps({"response": label})}}]}
+                lines.append(
+                    json.dumps(
+                        {
+                            "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "body": body},
+                            "error": None,
+                        }
+                    )
+                )
+            output_id = f"file-{len(outer._files)}"
+            outer._files[output_id] = "\n".join(lines).encode("utf-8")
+            batch = _Record(
+                id=f"batch-{len(outer._batches)}",
+                status="completed",
+                output_file_id=output_id,
+                created_at=time.time(),
+            )
+            outer._batches[batch.id] = batch
+            return batch
+
+        async def retrieve(self, batch_id: str):
+            return self.outer._batches[batch_id]
+
+
+class LocalBatchBackend(BatchBackend):
+    """BatchBackend answered in process by a FakeBackend, to run the batch path offline"""
+
+    name = "local-batch"
+    cache_source = "fake"
+
+    def __init__(self, model: str, temperature: float, seed: int):
+        super().__init__(LocalBatchClient(), model, temperature, seed)
+
+
+class _Record:
+    """Attribute bag mimicking the SDK's response objects"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
@@ -0,0 +1 @@
+"""Benchmarks for the evaluation backend. Run from the backend directory."""
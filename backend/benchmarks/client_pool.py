@@ -0,0 +1,125 @@
+"""
+Benchmark cold start and per-call connection overhead of the model client.
+
+Cold start is the time to import the API module in a fresh interpreter.
+Connection overhead is measured against the fake model server from
+benchmarks.load, in its own process, with a fixed latency: bursts of concurrent calls go out
+through the SDK's default client and through the pooled client from
+clients.py, and the time each call spent beyond the server latency is
+reported.
+
+Usage:
+    python -m benchmarks.client_pool [--concurrency 32] [--bursts 6] [--latency 0.05] [--pause 6]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+
+from benchmarks.load import BACKEND_DIR, free_port, percentile
+
+SERVER = """
+import time
+from benchmarks.load import FakeModelServer
+server = FakeModelServer({latency}, 0.0, 0.0, 0.0, 0, 1.0)
+server.port = {port}
+server.start()
+while True:
+    time.sleep(60)
+"""
+
+
+async def wait_for_port(port: int):
+    for _ in range(200):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("Fake model server did not start")
+
+
+def cold_start(runs: int) -> float:
+    """Median seconds to import main in a new interpreter, without an API key"""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+        )
+        times.append(float(output.stdout.strip().splitlines()[-1]))
+    return percentile(times, 0.5)
+
+
+async def bursts(client, concurrency: int, count: int, pause: float, latency: float):
+    """Per-call seconds beyond the server latency, over ``count`` bursts"""
+    from backends import ChatBackend
+
+    backend = ChatBackend(client, "gpt-4o", 0.0, 42)
+    overheads = []
+
+    async def _call(index: int, record: bool):
+        started = time.perf_counter()
+        await backend.classify("benchmark", f"question {index}")
+        if record:
+            overheads.append(time.perf_counter() - started - latency)
+
+    # The first burst opens every connection for both clients and is not counted
+    for burst in range(count + 1):
+        await asyncio.gather(*(_call(index, burst > 0) for index in range(concurrency)))
+        # Idle between bursts, as between waves of submissions
+        await asyncio.sleep(pause)
+    await client.close()
+    return overheads
+
+
+async def run(concurrency: int, count: int, latency: float, pause: float):
+    import openai
+    from clients import create_client
+
+    # The server gets its own process, so its work does not slow the client down
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER.format(latency=latency, port=port)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+    )
+    await wait_for_port(port)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    print(f"{concurrency} concurrent calls x {count} bursts, {latency * 1000:.0f}ms server latency")
+    print(f"{'client':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'max (ms)':>9}")
+    clients = {
+        "default": lambda: openai.AsyncOpenAI(max_retries=0),
+        "pooled": create_client,
+    }
+    for name, factory in clients.items():
+        overheads = await bursts(factory(), concurrency, count, pause, latency)
+        print(
+            f"{name:>10} {percentile(overheads, 0.5) * 1000:>9.1f} "
+            f"{percentile(overheads, 0.95) * 1000:>9.1f} {max(overheads) * 1000:>9.1f}"
+        )
+    server.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32, help="Calls per burst")
+    parser.add_argument("--bursts", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.05, help="Server seconds per call")
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=6.0,
+        help="Idle seconds between bursts (the SDK default drops idle connections after 5)",
+    )
+    parser.add_argument("--cold-start-runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Cold start (import main): {cold_start(args.cold_start_runs) * 1000:.0f}ms")
+    asyncio.run(run(args.concurrency, args.bursts, args.latency, args.pause))
@@ -0,0 +1,54 @@
+"""
+Benchmark evaluate.call_openai_api against a fake backend that sleeps per call.
+
+Usage:
+    python -m benchmarks.eval_concurrency [--latency 0.05] [--levels 1,2,4,8,16]
+"""
+import argparse
+import asyncio
+import time
+
+import evaluate
+from backends import FakeBackend
+from evaluate import load_questions
+
+
+def install_fake_backend(latency: float, jitter: float = 0.0) -> FakeBackend:
+    """Replace the shared classifier backend with a sleeping fake"""
+    # Every level must reach the backend, so bypass the classification cache
+    evaluate.CACHE_ENABLED = False
+    backend = FakeBackend(latency=latency, jitter=jitter)
+    evaluate.set_backend(backend)
+    return backend
+
+
+async def run(levels, latency: float, jitter: float, filename: str):
+    questions = load_questions(filename)
+    install_fake_backend(latency, jitter)
+    baseline = None
+
+    print(f"{len(questions)} questions, {latency * 1000:.0f}ms per call")
+    print(f"{'concurrency':>12} {'wall (s)':>10} {'speedup':>8} {'p50 (ms)':>9} {'max (ms)':>9}")
+    for level in levels:
+        started = time.perf_counter()
+        results = await evaluate.call_openai_api("benchmark", questions, concurrency=level)
+        wall = time.perf_counter() - started
+        baseline = baseline or wall
+
+        latencies = sorted(r["latency"] for r in results.values())
+        p50 = latencies[len(latencies) // 2] * 1000
+        print(
+            f"\r{level:>12} {wall:>10.2f} {baseline / wall:>7.1f}x {p50:>9.1f} {latencies[-1] * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random seconds per call")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--questions", default="data/test_questions.csv")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    asyncio.run(run(levels, args.latency, args.jitter, args.questions))
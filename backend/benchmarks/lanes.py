@@ -0,0 +1,100 @@
+"""
+Benchmark interactive latency while background lanes saturate the model scheduler.
+
+Quick checks (20 questions each) arrive at a steady rate while final and
+bulk evaluations of the full test set keep every remaining slot busy.
+Each scenario reports quick-check latency and per-lane queue wait; the
+"single lane" scenario charges everything to one lane for comparison.
+
+Usage:
+    python -m benchmarks.lanes [--capacity 32] [--latency 0.05] [--quick 40]
+"""
+import argparse
+import asyncio
+import time
+
+import evaluate
+from benchmarks.eval_concurrency import install_fake_backend
+from evaluate import load_questions
+from metrics import MODEL_QUEUE_WAIT_SECONDS
+from scheduler import ModelScheduler, model_lane, INTERACTIVE, FINAL, BULK
+import scheduler as scheduling
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def mean_wait(lane: str) -> float:
+    """Mean queue wait so far for a lane, from the histogram"""
+    for suffix, labels, value in MODEL_QUEUE_WAIT_SECONDS.samples():
+        if suffix == "_sum" and f'"{lane}"' in labels:
+            total = value
+        if suffix == "_count" and f'"{lane}"' in labels:
+            return total / value if value else 0.0
+    return 0.0
+
+
+async def scenario(name, capacity, quick_count, interval, background, lanes):
+    quick = load_questions("data/check_questions.csv")
+    full = load_questions("data/test_questions.csv")
+    scheduling.scheduler = ModelScheduler(capacity)
+    evaluate.scheduler = scheduling.scheduler
+    MODEL_QUEUE_WAIT_SECONDS._values.clear()
+    stop = asyncio.Event()
+
+    async def _background(lane: str, user: str):
+        index = 0
+        while not stop.is_set():
+            with model_lane(lane, user):
+                await evaluate.call_openai_api(f"{user} {index}", full, concurrency=capacity)
+            index += 1
+
+    async def _quick(index: int):
+        started = time.perf_counter()
+        with model_lane(lanes[0], f"participant-{index}"):
+            await evaluate.call_openai_api(f"participant {index}", quick)
+        return time.perf_counter() - started
+
+    workers = [
+        asyncio.create_task(_background(lanes[1 + i % 2], f"background-{i}"))
+        for i in range(background)
+    ]
+    await asyncio.sleep(0.5)
+    tasks = []
+    for index in range(quick_count):
+        tasks.append(asyncio.create_task(_quick(index)))
+        await asyncio.sleep(interval)
+    durations = await asyncio.gather(*tasks)
+    stop.set()
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+    waits = " ".join(f"{lane}={mean_wait(lane) * 1000:.0f}ms" for lane in (INTERACTIVE, FINAL, BULK))
+    print(
+        f"{name:>22} {percentile(durations, 0.5) * 1000:>9.0f} "
+        f"{percentile(durations, 0.95) * 1000:>9.0f}   {waits}"
+    )
+
+
+async def run(capacity: int, latency: float, quick_count: int, interval: float, background: int):
+    install_fake_backend(latency)
+    print(f"capacity {capacity}, {latency * 1000:.0f}ms per call, {quick_count} quick checks")
+    print(f"{'scenario':>22} {'p50 (ms)':>9} {'p95 (ms)':>9}   mean queue wait")
+    await scenario("idle", capacity, quick_count, interval, 0, (INTERACTIVE, FINAL, BULK))
+    await scenario("lanes + background", capacity, quick_count, interval, background, (INTERACTIVE, FINAL, BULK))
+    await scenario("single lane", capacity, quick_count, interval, background, (FINAL, FINAL, FINAL))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=32, help="Scheduler slots")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake call")
+    parser.add_argument("--quick", type=int, default=40, help="Quick checks to time")
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between quick checks")
+    parser.add_argument("--background", type=int, default=8, help="Background evaluations kept running")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.capacity, args.latency, args.quick, args.interval, args.background))
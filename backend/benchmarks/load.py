@@ -0,0 +1,420 @@
+"""
+End-to-end load and latency benchmark.
+
+Starts a fake OpenAI-compatible model server and the real API (uvicorn
+in a subprocess, throwaway working directory) pointed at it through
+OPENAI_BASE_URL. Simulated participants log in, submit and poll the
+leaderboard, then /winner scores everything. Reports p50/p95/p99 per
+endpoint, throughput, model calls per submission and peak memory, and
+writes the numbers as JSON so runs can be compared between commits.
+
+Usage:
+    python -m benchmarks.load [--participants 50] [--submissions 3]
+        [--latency-median 0.3] [--latency-sigma 0.5]
+        [--error-rate 0.01] [--rate-limit-rate 0.02] [--rpm 0]
+        [--output results.json] [--compare baseline.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+PACKED_LINE = re.compile(r"^(\d+): (.*)$")
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeModelServer:
+    """
+    OpenAI-compatible /v1/chat/completions with configurable behaviour.
+
+    Latency is log-normal around ``latency_median``. ``error_rate`` of the
+    requests fail with 500 and ``rate_limit_rate`` with 429; with ``rpm``
+    set, requests beyond that many per minute get 429 as well. Labels come
+    from FakeBackend, so scores depend on the prompt like they would live.
+    """
+
+    def __init__(
+        self,
+        latency_median: float,
+        latency_sigma: float,
+        error_rate: float,
+        rate_limit_rate: float,
+        rpm: int,
+        retry_after: float,
+    ):
+        from backends import FakeBackend, LABELS
+        from questions import get_question_set
+
+        answer_key = {}
+        for path in ("data/check_questions.csv", "data/test_questions.csv"):
+            answer_key.update(get_question_set(os.path.join(BACKEND_DIR, path)))
+        self.labels = FakeBackend(answer_key=answer_key)
+        # The answer key holds normalized labels; the schema wants the canonical spelling
+        self.canonical = {label.lower(): label for label in LABELS}
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.retry_after = retry_after
+        self.port = free_port()
+        self.counts: dict = defaultdict(int)
+        self._window: list = []
+
+    def app(self):
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse
+
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            self.counts["requests"] += 1
+            await asyncio.sleep(random.lognormvariate(0, self.latency_sigma) * self.latency_median)
+
+            if self._rate_limited() or random.random() < self.rate_limit_rate:
+                self.counts["429"] += 1
+                return JSONResponse(
+                    {"error": {"message": "Rate limit reached", "type": "requests"}},
+                    status_code=429,
+                    headers={"retry-after": str(self.retry_after)},
+                )
+            if random.random() < self.error_rate:
+                self.counts["500"] += 1
+                return JSONResponse({"error": {"message": "Server error"}}, status_code=500)
+
+            self.counts["200"] += 1
+            system_prompt, user_message = (m["content"] for m in body["messages"][:2])
+            schema = body["response_format"]["json_schema"]["schema"]
+            if "answers" in schema.get("properties", {}):
+                answers = []
+                for line in user_message.splitlines():
+                    match = PACKED_LINE.match(line)
+                    if match:
+                        answers.append(
+                            {"id": int(match.group(1)), "response": self._label(system_prompt, match.group(2))}
+                        )
+                content = {"answers": answers}
+            else:
+                content = {"response": self._label(system_prompt, user_message)}
+
+            prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+            self.counts["prompt_tokens"] += prompt_tokens
+            return {
+                "id": f"chatcmpl-{self.counts['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": json.dumps(content)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": 10,
+                    "total_tokens": prompt_tokens + 10,
+                },
+            }
+
+        return app
+
+    def _label(self, system_prompt: str, question: str) -> str:
+        label = self.labels.label_for(system_prompt, question)
+        return self.canonical.get(label.lower(), label)
+
+    def _rate_limited(self) -> bool:
+        if not self.rpm:
+            return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 60]
+        if len(self._window) >= self.rpm:
+            return True
+        self._window.append(now)
+        return False
+
+    def start(self):
+        import uvicorn
+
+        config = uvicorn.Config(self.app(), host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        thread = threading.Thread(target=self.server.run, daemon=True)
+        thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+
+
+def start_api(workdir: str, model_port: int, env_overrides: dict) -> tuple:
+    port = free_port()
+    env = dict(os.environ)
+    env.update(
+        {
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{model_port}/v1",
+            "CLASSIFIER_BACKEND": "chat",
+            "PYTHONPATH": BACKEND_DIR,
+        }
+    )
+    env.update(env_overrides)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    return process, port
+
+
+async def wait_ready(client, process):
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError("API process exited during startup")
+        try:
+            if (await client.get("/leaderboard")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("API did not become ready")
+
+
+async def drive(args, api_port: int, process, fake: FakeModelServer) -> dict:
+    import httpx
+
+    latencies: dict = defaultdict(list)
+    errors: dict = defaultdict(int)
+
+    limits = httpx.Limits(max_connections=args.participants * 2)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{api_port}", timeout=None, limits=limits
+    ) as client:
+        await wait_ready(client, process)
+
+        async def _request(label: str, method: str, url: str, **kwargs):
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies[label].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[label] += 1
+            return response
+
+        async def _poll(done: asyncio.Event):
+            etags: dict = {}
+            while not done.is_set():
+                for url in ("/leaderboard", "/top3"):
+                    headers = {"If-None-Match": etags[url]} if url in etags else {}
+                    response = await _request(f"GET {url}", "GET", url, headers=headers)
+                    if "etag" in response.headers:
+                        etags[url] = response.headers["etag"]
+                try:
+                    await asyncio.wait_for(done.wait(), args.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        async def _participant(i: int):
+            name = f"participant{i}"
+            done = asyncio.Event()
+            poller = asyncio.create_task(_poll(done))
+            await _request("POST /login", "POST", "/login", json={"name": name})
+            for attempt in range(args.submissions):
+                solution = f"Prompt {i}.{attempt}: classify questions as Sticos, SupportAI or innsiktsmodulen."
+                await _request("POST /submit", "POST", "/submit", json={"name": name, "solution": solution})
+            done.set()
+            await poller
+
+        model_before = dict(fake.counts)
+        started = time.perf_counter()
+        await asyncio.gather(*(_participant(i) for i in range(args.participants)))
+        submit_wall = time.perf_counter() - started
+        model_submit = {k: fake.counts[k] - model_before.get(k, 0) for k in fake.counts}
+
+        winner_url = "/winner?prune=true" if args.winner_mode == "prune" else "/winner"
+        model_before = dict(fake.counts)
+        started = time.perf_counter()
+        await _request(f"POST {winner_url}", "POST", winner_url)
+        winner_wall = time.perf_counter() - started
+        model_winner = {k: fake.counts[k] - model_before.get(k, 0) for k in fake.counts}
+
+    submissions = args.participants * args.submissions
+    return {
+        "endpoints": {
+            label: {
+                "count": len(values),
+                "errors": errors[label],
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            }
+            for label, values in sorted(latencies.items())
+        },
+        "submit_phase": {
+            "wall_s": round(submit_wall, 3),
+            "submissions_per_s": round(submissions / submit_wall, 2),
+            "model_calls": model_submit.get("requests", 0),
+            "model_calls_per_submission": round(model_submit.get("requests", 0) / submissions, 2),
+            "model_429": model_submit.get("429", 0),
+            "model_500": model_submit.get("500", 0),
+            "model_prompt_tokens": model_submit.get("prompt_tokens", 0),
+        },
+        "winner_phase": {
+            "wall_s": round(winner_wall, 3),
+            "model_calls": model_winner.get("requests", 0),
+            "model_429": model_winner.get("429", 0),
+            "model_500": model_winner.get("500", 0),
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict):
+    print(f"\nCommit {report['commit']}, {report['config']['participants']} participants "
+          f"x {report['config']['submissions']} submissions")
+    print(f"{'endpoint':<28}{'count':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, stats in report["endpoints"].items():
+        print(
+            f"{label:<28}{stats['count']:>7}{stats['errors']:>6}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+    submit, winner = report["submit_phase"], report["winner_phase"]
+    print(
+        f"submit phase: {submit['wall_s']}s, {submit['submissions_per_s']} submissions/s, "
+        f"{submit['model_calls_per_submission']} model calls/submission "
+        f"({submit['model_429']} x 429, {submit['model_500']} x 500)"
+    )
+    print(f"winner: {winner['wall_s']}s, {winner['model_calls']} model calls")
+    print(f"peak memory: API {report['peak_rss_mb']['api']} MB, benchmark {report['peak_rss_mb']['benchmark']} MB")
+
+
+def compare(report: dict, baseline: dict):
+    """Print relative change against a previous run for the headline numbers"""
+    print(f"\nCompared with {baseline.get('commit', '?')}:")
+    rows = [
+        (f"{label} p95", ("endpoints", label, "p95_ms")) for label in report["endpoints"]
+    ] + [
+        ("submissions/s", ("submit_phase", "submissions_per_s")),
+        ("model calls/submission", ("submit_phase", "model_calls_per_submission")),
+        ("winner wall", ("winner_phase", "wall_s")),
+        ("API peak MB", ("peak_rss_mb", "api")),
+    ]
+    for label, path in rows:
+        old, new = baseline, report
+        for key in path:
+            old = old.get(key, {}) if isinstance(old, dict) else {}
+            new = new.get(key, {}) if isinstance(new, dict) else {}
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+            print(f"  {label:<34}{old:>10}{new:>10}  {(new - old) / old * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark against a fake model server")
+    parser.add_argument("--participants", type=int, default=50)
+    parser.add_argument("--submissions", type=int, default=3, help="Submissions per participant (max 5)")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between leaderboard polls")
+    parser.add_argument("--latency-median", type=float, default=0.3, help="Median model latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of model latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of model calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of model calls getting 429")
+    parser.add_argument("--rpm", type=int, default=0, help="Model requests per minute before 429 (0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429")
+    parser.add_argument("--winner-mode", choices=["parallel", "prune"], default="parallel")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the API process")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    os.symlink(os.path.join(BACKEND_DIR, "data"), os.path.join(workdir, "data"))
+
+    fake = FakeModelServer(
+        args.latency_median,
+        args.latency_sigma,
+        args.error_rate,
+        args.rate_limit_rate,
+        args.rpm,
+        args.retry_after,
+    )
+    fake.start()
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+    process, api_port = start_api(workdir, fake.port, env_overrides)
+    try:
+        results = asyncio.run(drive(args, api_port, process, fake))
+    finally:
+        process.terminate()
+        process.wait()
+        fake.stop()
+
+    # ru_maxrss is in kilobytes on Linux
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "config": vars(args),
+        **results,
+        "peak_rss_mb": {
+            "api": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+            "benchmark": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    # A run where nothing got through measured nothing; make it fail
+    submits = report["endpoints"].get("POST /submit", {"count": 0, "errors": 0})
+    if submits["count"] == 0 or submits["errors"] == submits["count"]:
+        sys.exit(f"\nEvery submission failed ({submits['errors']}/{submits['count']}), see the API log")
+    if report["submit_phase"]["model_calls"] == 0:
+        sys.exit("\nNo submission reached the model server, see the API log")
+
+
+if __name__ == "__main__":
+    main()
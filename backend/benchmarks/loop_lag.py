@@ -0,0 +1,88 @@
+"""
+Measure event-loop lag while many submissions are processed.
+
+Runs the FastAPI app in-process against FakeBackend and a throwaway
+database, fires concurrent /submit requests with leaderboard polling, and
+samples how late a periodic timer fires on the same loop.
+
+Usage:
+    python -m benchmarks.loop_lag [--submissions 200] [--latency 0.05]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def monitor_lag(samples: list, stop: asyncio.Event, interval: float = 0.005):
+    """Record how much later than requested each short sleep returns"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def run(args):
+    import httpx
+    import evaluate
+    import main
+    from backends import FakeBackend
+    from async_database import init_db
+
+    await init_db()
+    evaluate.set_backend(FakeBackend(latency=args.latency, jitter=args.latency))
+
+    samples: list = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(samples, stop))
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def _participant(i: int):
+            async with semaphore:
+                await client.post("/submit", json={"name": f"user{i}", "solution": f"prompt {i}"})
+                await client.get("/final")
+                await client.get("/leaderboard")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_participant(i) for i in range(args.submissions)))
+        wall = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+
+    lag_ms = [sample * 1000 for sample in samples]
+    print(f"\n{args.submissions} submissions in {wall:.2f}s ({args.submissions / wall:.1f}/s)")
+    print(
+        f"event-loop lag: mean {statistics.mean(lag_ms):.2f}ms  p50 {percentile(lag_ms, 0.5):.2f}ms  "
+        f"p99 {percentile(lag_ms, 0.99):.2f}ms  max {max(lag_ms):.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure event-loop lag under load")
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="Submissions in flight")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    args = parser.parse_args()
+
+    # Throwaway working directory: fresh database, logs and cache
+    backend_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="loop-lag-")
+    os.symlink(os.path.join(backend_dir, "data"), os.path.join(workdir, "data"))
+    os.chdir(workdir)
+    sys.path.insert(0, backend_dir)
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["CLASSIFIER_BACKEND"] = "fake"
+
+    asyncio.run(run(args))
@@ -0,0 +1,75 @@
+"""
+Parity benchmark: one question per call versus K questions packed per call.
+
+Compares accuracy, agreement, request count and token usage of both modes.
+Runs offline against FakeBackend by default; pass --backend chat (with
+OPENAI_API_KEY set) to measure the live model.
+
+Usage:
+    python -m benchmarks.packing [--pack-size 10] [--backend fake|chat] [--prompt-file prompt.txt]
+"""
+import argparse
+import asyncio
+
+import evaluate
+from backends import FakeBackend
+from evaluate import load_questions, parse_openai_response
+
+SAMPLE_PROMPT = """
+Du klassifiserer kundespørsmål til Tripletex. Svar med én kategori:
+- Sticos: faglige spørsmål om regnskap, skatt, avgift, lønn og arbeidsrett.
+- SupportAI: spørsmål om hvordan man gjør noe i Tripletex-systemet.
+- innsiktsmodulen: spørsmål om selskapets egne tall, budsjett og resultater.
+"""
+
+
+async def run_mode(prompt: str, questions, backend, pack_size: int):
+    backend.requests = backend.prompt_tokens = backend.completion_tokens = 0
+    response = await evaluate.call_openai_api(
+        prompt, questions, backend=backend, pack_size=pack_size
+    )
+    results = await parse_openai_response(response, questions)
+    return {
+        "results": results,
+        "correct": sum(result["correct"] for result in results.values()),
+        "requests": backend.requests,
+        "prompt_tokens": backend.prompt_tokens,
+        "completion_tokens": backend.completion_tokens,
+    }
+
+
+async def run(args):
+    # Both modes must reach the backend
+    evaluate.CACHE_ENABLED = False
+    questions = load_questions(args.questions)
+    prompt = open(args.prompt_file, encoding="utf-8").read() if args.prompt_file else SAMPLE_PROMPT
+    if args.backend == "fake":
+        backend = FakeBackend(answer_key=questions, drop_rate=args.drop_rate)
+    else:
+        backend = evaluate.create_backend(args.backend)
+
+    single = await run_mode(prompt, questions, backend, 1)
+    packed = await run_mode(prompt, questions, backend, args.pack_size)
+
+    agree = sum(
+        single["results"][key]["classification"] == packed["results"][key]["classification"]
+        for key in single["results"]
+    )
+    total = len(questions)
+
+    print(f"\n{total} questions, {args.backend} backend, K={args.pack_size}")
+    print(f"{'':>16} {'single':>10} {'packed':>10} {'ratio':>8}")
+    for field in ("correct", "requests", "prompt_tokens", "completion_tokens"):
+        ratio = single[field] / packed[field] if packed[field] else float("inf")
+        print(f"{field:>16} {single[field]:>10} {packed[field]:>10} {ratio:>7.1f}x")
+    print(f"{'agreement':>16} {agree}/{total}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare packed and single-question evaluation")
+    parser.add_argument("--pack-size", type=int, default=10)
+    parser.add_argument("--backend", default="fake", choices=["fake", "chat"])
+    parser.add_argument("--prompt-file", help="System prompt to evaluate (default: a sample prompt)")
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="Fake backend: fraction of ids left out of packed answers")
+    parser.add_argument("--questions", default="data/test_questions.csv")
+    asyncio.run(run(parser.parse_args()))
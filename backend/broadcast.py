@@ -0,0 +1,170 @@
+"""
+Push leaderboard changes to connected clients.
+
+One broadcaster per process watches the leaderboard version, which every
+write to scores bumps, including writes from worker processes. When it
+changes, each subscribed view is rebuilt once through the snapshot cache,
+diffed against the rows clients already have, and the same encoded delta
+is handed to every subscriber. Between score changes the only work is one
+single-row version read per poll interval, however many clients listen.
+"""
+import os
+import json
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from database import get_leaderboard_version
+from db import run_in_db_thread
+from metrics import LEADERBOARD_STREAM_CLIENTS, LEADERBOARD_DELTAS
+from snapshots import snapshot_cache
+
+# Seconds to wait after a change before sending it, so bursts go out as one delta
+LEADERBOARD_COALESCE_SECONDS = float(os.getenv("LEADERBOARD_COALESCE_SECONDS", "0.5"))
+# Seconds between version checks, for writes made by other processes
+LEADERBOARD_POLL_INTERVAL = float(os.getenv("LEADERBOARD_POLL_INTERVAL", "2"))
+# Messages a client may fall behind before it is sent a fresh snapshot instead
+LEADERBOARD_CLIENT_BUFFER = int(os.getenv("LEADERBOARD_CLIENT_BUFFER", "16"))
+# Seconds of silence after which a stream sends a keep-alive comment
+LEADERBOARD_HEARTBEAT_SECONDS = float(os.getenv("LEADERBOARD_HEARTBEAT_SECONDS", "15"))
+
+Rows = List[Dict[str, Any]]
+
+
+def format_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> bytes:
+    """Encode a single Server-Sent Event"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def ranked(rows: Rows) -> Rows:
+    """Rows with their 1-based position in the view"""
+    return [{**row, "rank": rank} for rank, row in enumerate(rows, 1)]
+
+
+def diff_rows(old: Rows, new: Rows) -> Tuple[Rows, List[str]]:
+    """
+    Row-level changes between two versions of a view, keyed by name
+
+    Returns:
+        (rows that are new or changed, including a changed rank; names no longer shown)
+    """
+    before = {row["name"]: row for row in ranked(old)}
+    after = ranked(new)
+    changed = [row for row in after if before.get(row["name"]) != row]
+    names = {row["name"] for row in after}
+    removed = [name for name in before if name not in names]
+    return changed, removed
+
+
+class Subscriber:
+    """Messages waiting to be sent to one client of a view"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(LEADERBOARD_CLIENT_BUFFER)
+
+
+class LeaderboardBroadcaster:
+    """
+    Fans out leaderboard snapshots and deltas to streaming clients.
+
+    Keeps the last version and rows of every view that has subscribers. A
+    client gets those rows as a snapshot when it connects, then the deltas
+    from there on. A client too slow to keep up has its backlog replaced by
+    one snapshot of the current rows. The watch task runs only while
+    someone is subscribed. Only used from the event loop.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._views: Dict[str, Tuple[int, Rows]] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        """The leaderboard was written in this process: look now instead of at the next poll"""
+        self._changed.set()
+
+    async def _load(self, kind: str) -> Tuple[int, Rows]:
+        version, body = await run_in_db_thread(snapshot_cache.get, kind)
+        return version, json.loads(body)
+
+    def _snapshot(self, kind: str) -> bytes:
+        version, rows = self._views[kind]
+        return format_event("snapshot", {"version": version, "rows": ranked(rows)}, version)
+
+    async def subscribe(self, kind: str) -> Subscriber:
+        """Register a client of a view; its queue starts with a snapshot"""
+        if kind not in self._views:
+            version, rows = await self._load(kind)
+            # Another client may have loaded a newer version in the meantime
+            if kind not in self._views or self._views[kind][0] < version:
+                self._views[kind] = (version, rows)
+
+        subscriber = Subscriber(kind)
+        subscriber.queue.put_nowait(self._snapshot(kind))
+        subscribers = self._subscribers.setdefault(kind, set())
+        subscribers.add(subscriber)
+        LEADERBOARD_STREAM_CLIENTS.set(len(subscribers), view=kind)
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.kind)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        LEADERBOARD_STREAM_CLIENTS.set(len(subscribers), view=subscriber.kind)
+        if not subscribers:
+            # Nobody keeps this view current any more
+            del self._subscribers[subscriber.kind]
+            self._views.pop(subscriber.kind, None)
+
+    async def _watch(self):
+        try:
+            while self._subscribers:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), LEADERBOARD_POLL_INTERVAL)
+                    await asyncio.sleep(LEADERBOARD_COALESCE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+
+                try:
+                    version = await run_in_db_thread(get_leaderboard_version)
+                    for kind in list(self._subscribers):
+                        if kind in self._views and self._views[kind][0] < version:
+                            await self._publish(kind)
+                except Exception as e:
+                    # Clients keep their rows; the next check tries again
+                    print(f"Leaderboard broadcaster error: {e}")
+        finally:
+            self._task = None
+
+    async def _publish(self, kind: str):
+        version, rows = await self._load(kind)
+        current = self._views.get(kind)
+        # Unsubscribed while loading, or a newer version is already out
+        if current is None or kind not in self._subscribers or current[0] >= version:
+            return
+
+        changed, removed = diff_rows(current[1], rows)
+        self._views[kind] = (version, rows)
+        if not changed and not removed:
+            # The write did not touch this view
+            return
+        message = format_event(
+            "delta", {"version": version, "changed": changed, "removed": removed}, version
+        )
+        for subscriber in self._subscribers[kind]:
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(self._snapshot(kind))
+        LEADERBOARD_DELTAS.inc(view=kind)
+
+
+broadcaster = LeaderboardBroadcaster()
@@ -0,0 +1,221 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from db import DB_PATH, run_in_db_thread
+from metrics import CACHE_HITS, CACHE_MISSES
+
+# Stored next to leaderboard.db
+CACHE_PATH = os.getenv(
+    "CLASSIFICATION_CACHE_DB",
+    os.path.join(os.path.dirname(DB_PATH), "classification_cache.db"),
+)
+# Entries kept in the in-memory LRU front
+CACHE_MEMORY_SIZE = int(os.getenv("CLASSIFICATION_CACHE_MEMORY_SIZE", "4096"))
+# Entries kept on disk before the least recently used ones are evicted
+CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "200000"))
+CACHE_ENABLED = os.getenv("CLASSIFICATION_CACHE", "1") != "0"
+
+
+def make_key(
+    source: str, model: str, system_prompt: str, question: str, seed: int, temperature: float
+) -> str:
+    """
+    Content address for a single classification request
+
+    ``source`` is the backend's ``cache_source``, so answers from an offline
+    backend are never served as answers of the live model.
+    """
+    digest = hashlib.sha256()
+    for part in (source, model, system_prompt, question, str(seed), repr(float(temperature))):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ClassificationCache:
+    """
+    Persistent cache of model classifications with an in-memory LRU front.
+
+    Entries live in SQLite so repeat evaluations survive restarts. The disk
+    store is bounded to ``max_entries`` by evicting the least recently used
+    rows.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        memory_size: int = CACHE_MEMORY_SIZE,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        # Separate locks, so memory hits on the event loop never wait for disk I/O
+        self._memory_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_evict = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS classifications (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    classification TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_classifications_last_used ON classifications(last_used)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, classification: str):
+        with self._memory_lock:
+            self._memory[key] = classification
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                CACHE_HITS.inc(tier="memory")
+                return self._memory[key]
+        return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT classification FROM classifications WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_MISSES.inc()
+                return None
+
+            conn.execute(
+                "UPDATE classifications SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            conn.commit()
+            self.hits += 1
+            CACHE_HITS.inc(tier="disk")
+
+        self._remember(key, row[0])
+        return row[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached classification for a key, or None on a miss"""
+        cached = self._get_memory(key)
+        if cached is not None:
+            return cached
+        return self._get_disk(key)
+
+    def first_missing(self, keys: List[str]) -> Optional[int]:
+        """
+        Index of the first key with no cached classification, or None if all are cached
+
+        A read-only check: hit and miss counts and recency are left alone.
+        """
+        for index, key in enumerate(keys):
+            with self._memory_lock:
+                if key in self._memory:
+                    continue
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT 1 FROM classifications WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return index
+        return None
+
+    async def afirst_missing(self, keys: List[str]) -> Optional[int]:
+        """Like first_missing, on the database threads"""
+        return await run_in_db_thread(self.first_missing, keys)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Like get, but reads the disk store on the database threads"""
+        cached = self._get_memory(key)
+        if cached is not None:
+            return cached
+        return await run_in_db_thread(self._get_disk, key)
+
+    async def aput(self, key: str, model: str, classification: str):
+        """Like put, but writes on the database threads"""
+        await run_in_db_thread(self.put, key, model, classification)
+
+    def put(self, key: str, model: str, classification: str):
+        """Store a classification and evict old entries if the store is full"""
+        self._remember(key, classification)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO classifications (key, model, classification, last_used) VALUES (?, ?, ?, ?)",
+                (key, model, classification, time.time()),
+            )
+            conn.commit()
+
+            # Counting the table on every write is wasteful, so evict in batches
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= max(1, self.max_entries // 100):
+                self._writes_since_evict = 0
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        (count,) = conn.execute("SELECT COUNT(*) FROM classifications").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                """
+                DELETE FROM classifications WHERE key IN (
+                    SELECT key FROM classifications ORDER BY last_used ASC LIMIT ?
+                )
+                """,
+                (excess,),
+            )
+            conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            (size,) = self._connection().execute(
+                "SELECT COUNT(*) FROM classifications"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "memory_size": len(self._memory),
+            "size": size,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+classification_cache = ClassificationCache()
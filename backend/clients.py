@@ -0,0 +1,87 @@
+"""
+Process-wide OpenAI client, built on first use.
+
+The SDK and its HTTP stack are only imported when a live backend needs a
+client, so importing the API, the worker or the scripts does not pay for
+them or need an API key. The connection pool is sized to the model
+scheduler, so every call that holds a slot can reuse a warm keep-alive
+connection instead of opening a new one.
+"""
+import os
+import importlib
+import importlib.util
+from typing import Any, Optional
+
+from scheduler import MODEL_CONCURRENCY
+
+# Connections kept open to the API; defaults to the model calls allowed in flight
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", str(MODEL_CONCURRENCY)))
+# Seconds an idle keep-alive connection is kept before it is closed
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+# Seconds to connect, and to wait for a response, per request
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Multiplex requests over HTTP/2 (needs the h2 package: pip install httpx[http2])
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "0") == "1"
+
+_client: Optional[Any] = None
+
+
+def _http2_available() -> bool:
+    if not OPENAI_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        print("OPENAI_HTTP2 is set but the h2 package is missing, using HTTP/1.1")
+        return False
+    return True
+
+
+def _sdk_http_module(openai: Any) -> Any:
+    """
+    The HTTP package the installed SDK is built on
+
+    Older releases use httpx and newer ones httpx2. Limits and timeouts
+    must come from the same package as the client, or requests fail when
+    the client combines them with its own types.
+    """
+    for base in openai.DefaultAsyncHttpxClient.__mro__[1:]:
+        package = base.__module__.split(".")[0]
+        if package != "openai":
+            return importlib.import_module(package)
+    raise RuntimeError("Could not find the HTTP package of the OpenAI SDK")
+
+
+def create_client():
+    """Build an AsyncOpenAI client with a connection pool sized for our concurrency"""
+    import openai
+
+    httpx = _sdk_http_module(openai)
+    http_client = openai.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        http2=_http2_available(),
+    )
+    # Retries are handled per question in resilience.call_with_retries
+    return openai.AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0
+    )
+
+
+def get_client():
+    """Return the shared client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+async def close_client():
+    """Close the shared client's connections; the next get_client() builds a new one"""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.close()
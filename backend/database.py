@@ -1,46 +1,36 @@
-import sqlite3
+import json
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+from db import connection, transaction, migrate, refresh_leaderboard_entry
+from quota import consume_try, get_used_tries
+
 
 def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
-
-    # Create scores table with tries field
-    cursor.execute(
-        """
-    CREATE TABLE IF NOT EXISTS scores (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        score INTEGER NOT NULL,
-        finalScore INTEGER,
-        solution TEXT,
-        timestamp TEXT NOT NULL,
-        tries INTEGER DEFAULT 10
-    )
-    """
-    )
+    """Initialize the database, applying any pending schema migrations"""
+    version = migrate()
 
-    # Check if tries column exists and add it if it doesn't
-    cursor.execute("PRAGMA table_info(scores)")
-    columns = [col[1] for col in cursor.fetchall()]
-    
-    if "tries" not in columns:
-        print("Migrating database: Adding 'tries' column to scores table")
-        cursor.execute("ALTER TABLE scores ADD COLUMN tries INTEGER DEFAULT 0")
+    print(f"Database initialized successfully (schema version {version})")
 
-    conn.commit()
-    conn.close()
 
-    print("Database initialized successfully")
+def _usage_values(usage: Optional[Dict[str, Any]]) -> tuple:
+    """Column values for prompt, completion and cached tokens and cost"""
+    if usage is None:
+        return (None, None, None, None)
+    return (
+        usage["prompt_tokens"],
+        usage["completion_tokens"],
+        usage["cached_tokens"],
+        usage["cost_usd"],
+    )
 
 
 def save_submission(
     name: str,
     score: int,
     solution: Optional[str] = None,
+    question_set_version: Optional[str] = None,
+    usage: Optional[Dict[str, Any]] = None,
 ) -> int:
     """
     Save a user submission to the database
@@ -49,36 +39,49 @@ def save_submission(
         name: User's name
         score: The score achieved (1-5)
         solution: The user's solution text
+        question_set_version: Version of the question set behind score
+        usage: Token usage and cost of the evaluation (usage.Usage.as_dict())
 
     Returns:
         The ID of the inserted record
     """
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
     timestamp = datetime.now().isoformat()
 
-    # Check the current number of tries
-    cursor.execute(
-        "SELECT tries FROM scores WHERE name = ? ORDER BY timestamp DESC LIMIT 1",
-        (name,),
-    )
-    row = cursor.fetchone()
-    tries = row[0] + 1 if row else 1
-
-    cursor.execute(
-        "INSERT INTO scores (name, score, finalScore, solution, timestamp, tries) VALUES (?, ?, ?, ?, ?, ?)",
-        (name, score, 0, solution, timestamp, tries),
-    )
-    last_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return last_id
+    with transaction() as conn:
+        # Count the try against the user's quota (the reservation taken before evaluating)
+        tries = consume_try(conn, name)
+
+        cursor = conn.execute(
+            """
+            INSERT INTO scores (
+                name, score, finalScore, solution, timestamp, tries, questionSetVersion,
+                promptTokens, completionTokens, cachedTokens, costUsd
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                name,
+                score,
+                0,
+                solution,
+                timestamp,
+                tries,
+                question_set_version,
+                *_usage_values(usage),
+            ),
+        )
+        refresh_leaderboard_entry(conn, name)
+        return cursor.lastrowid
 
 
 def update_submission(
     name: str,
     solution: str,
     new_final_score: int,
+    upper_bound: Optional[int] = None,
+    question_set_version: Optional[str] = None,
+    usage: Optional[Dict[str, Any]] = None,
+    submission_id: Optional[int] = None,
 ) -> bool:
     """
     Update the final score for a user's submission
@@ -87,26 +90,85 @@ def update_submission(
         name: User's name
         solution: The user's solution text
         new_final_score: The final score achieved (0-100)
+        upper_bound: For a pruned evaluation, the best score it could have
+            reached; new_final_score is then only the correct count so far
+        question_set_version: Version of the question set behind the final score
+        usage: Token usage and cost of the final evaluation (usage.Usage.as_dict())
+        submission_id: Only update this scores row; by default every row with
+            the same name and solution is updated
 
     Returns:
         True if the update was successful, False otherwise
     """
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
     timestamp = datetime.now().isoformat()
+    if submission_id is not None:
+        where, match = "id = ?", (submission_id,)
+    else:
+        where, match = "name = ? AND solution = ?", (name, solution)
+
+    with transaction() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE scores
+            SET finalScore = ?,
+                finalScoreUpperBound = ?,
+                finalQuestionSetVersion = ?,
+                finalPromptTokens = ?,
+                finalCompletionTokens = ?,
+                finalCachedTokens = ?,
+                finalCostUsd = ?,
+                timestamp = ?
+            WHERE {where}
+            """,
+            (
+                new_final_score,
+                upper_bound,
+                question_set_version,
+                *_usage_values(usage),
+                timestamp,
+                *match,
+            ),
+        )
+        if cursor.rowcount > 0:
+            refresh_leaderboard_entry(conn, name)
 
-    cursor.execute(
-        """
-        UPDATE scores
-        SET finalScore = ?,
-            timestamp = ?
-        WHERE name = ? AND solution = ?
-        """,
-        (new_final_score, timestamp, name, solution),
-    )
+    return cursor.rowcount > 0
+
+
+def save_provisional_score(
+    name: str,
+    solution: str,
+    score: int,
+    low: int,
+    high: int,
+) -> bool:
+    """
+    Publish a provisional final score while the exact one is computed
+
+    Shown in the final standings until update_submission stores the exact
+    score for the same submission.
+
+    Args:
+        name: User's name
+        solution: The user's solution text
+        score: Estimated final score
+        low: Lower end of the confidence interval
+        high: Upper end of the confidence interval
 
-    conn.commit()
-    conn.close()
+    Returns:
+        True if the submission was found, False otherwise
+    """
+    with transaction() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE scores
+            SET provisionalScore = ?, provisionalLow = ?, provisionalHigh = ?
+            WHERE name = ? AND solution = ?
+            """,
+            (score, low, high, name, solution),
+        )
+        if cursor.rowcount > 0:
+            refresh_leaderboard_entry(conn, name)
 
     return cursor.rowcount > 0
 
@@ -121,22 +183,16 @@ def get_leaderboard(limit: int = 10) -> List[Dict[str, Any]]:
     Returns:
         List of leaderboard entries
     """
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT name, MAX(score) AS max_score, MAX(timestamp) AS latest_timestamp
-        FROM scores
-        GROUP BY name
-        ORDER BY max_score DESC
-        LIMIT ?
-        """,
-        (limit,),
-    )
-
-    rows = cursor.fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT name, best_score, latest_timestamp
+            FROM leaderboard
+            ORDER BY best_score DESC
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
 
     return [{"name": row[0], "score": row[1], "timestamp": row[2]} for row in rows]
 
@@ -148,21 +204,15 @@ def get_top_three() -> List[Dict[str, Any]]:
     Returns:
         List of top three entries
     """
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT name, MAX(score) as max_score, timestamp
-        FROM scores
-        GROUP BY name
-        ORDER BY max_score DESC
-        LIMIT 3
-    """
-    )
-
-    rows = cursor.fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT name, best_score, best_score_timestamp
+            FROM leaderboard
+            ORDER BY best_score DESC
+            LIMIT 3
+            """
+        ).fetchall()
 
     return [{"name": row[0], "score": row[1], "timestamp": row[2]} for row in rows]
 
@@ -174,28 +224,201 @@ def get_latest_unscored_submissions() -> List[Dict[str, Any]]:
     Returns:
         List of dicts with keys: name, solution, timestamp
     """
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT s.name, s.solution, s.timestamp
-        FROM scores s
-        INNER JOIN (
-            SELECT name, MAX(timestamp) AS latest_ts
-            FROM scores
-            WHERE finalScore = 0
-            GROUP BY name
-        ) latest ON latest.name = s.name AND latest.latest_ts = s.timestamp
-        WHERE s.finalScore = 0
-        ORDER BY s.timestamp DESC
-        """
-    )
-
-    rows = cursor.fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT s.name, s.solution, s.timestamp
+            FROM scores s
+            INNER JOIN (
+                SELECT name, MAX(timestamp) AS latest_ts
+                FROM scores
+                WHERE finalScore = 0 AND finalScoreUpperBound IS NULL
+                GROUP BY name
+            ) latest ON latest.name = s.name AND latest.latest_ts = s.timestamp
+            WHERE s.finalScore = 0 AND s.finalScoreUpperBound IS NULL
+            ORDER BY s.timestamp DESC
+            """
+        ).fetchall()
 
     return [
         {"name": row[0], "solution": row[1], "timestamp": row[2]}
         for row in rows
     ]
+
+
+def get_submissions(
+    latest_only: bool = False, names: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Return stored submissions in the order they were made
+
+    Args:
+        latest_only: Only each user's latest submission
+        names: Only submissions by these users
+
+    Returns:
+        List of dicts with keys: id, name, solution, timestamp
+    """
+    query = "SELECT id, name, solution, timestamp FROM scores s"
+    conditions = []
+    params: List[Any] = []
+    if latest_only:
+        # By id: timestamp moves whenever a final score is written
+        conditions.append("s.id = (SELECT MAX(id) FROM scores latest WHERE latest.name = s.name)")
+    if names:
+        conditions.append(f"s.name IN ({', '.join('?' for _ in names)})")
+        params.extend(names)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY s.id"
+
+    with connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    return [
+        {"id": row[0], "name": row[1], "solution": row[2], "timestamp": row[3]} for row in rows
+    ]
+
+
+def get_best_final_scores() -> Dict[str, int]:
+    """
+    Return the best finalScore stored for each user
+
+    Returns:
+        Dict mapping user name to best finalScore
+    """
+    with connection() as conn:
+        rows = conn.execute("SELECT name, best_final_score FROM leaderboard").fetchall()
+
+    return {row[0]: row[1] or 0 for row in rows}
+
+
+def get_latest_tries(name: str) -> int:
+    """
+    Return the number of tries the user has used
+
+    Args:
+        name: User's name
+
+    Returns:
+        The number of tries, 0 if the user has not submitted yet
+    """
+    return get_used_tries(name)
+
+
+def get_final_standings() -> List[Dict[str, Any]]:
+    """
+    Return the best finalScore per user, best first
+
+    A provisional score that beats the user's best exact finalScore is
+    shown in its place, with its confidence interval.
+
+    Returns:
+        List of dicts with keys: name, score, timestamp, upper_bound,
+        provisional, low, high. upper_bound is set when the best finalScore
+        came from a pruned run; low and high when the score is provisional.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT l.name, l.best_final_score, l.latest_timestamp, l.final_upper_bound,
+                   p.score, p.low, p.high
+            FROM leaderboard l
+            LEFT JOIN (
+                SELECT name, provisionalScore AS score, provisionalLow AS low,
+                       provisionalHigh AS high, MAX(provisionalScore)
+                FROM scores
+                WHERE provisionalScore IS NOT NULL AND finalQuestionSetVersion IS NULL
+                GROUP BY name
+            ) p ON p.name = l.name
+            ORDER BY MAX(l.best_final_score, COALESCE(p.score, 0)) DESC
+            """
+        ).fetchall()
+
+    standings = []
+    for row in rows:
+        entry = {"name": row[0], "score": row[1], "timestamp": row[2], "upper_bound": row[3]}
+        provisional = row[4] is not None and row[4] > (row[1] or 0)
+        entry.update(
+            provisional=provisional,
+            low=row[5] if provisional else None,
+            high=row[6] if provisional else None,
+        )
+        if provisional:
+            entry.update(score=row[4], upper_bound=None)
+        standings.append(entry)
+    return standings
+
+
+def get_leaderboard_version() -> int:
+    """
+    Return the leaderboard version, bumped by every write that changes it
+
+    Returns:
+        A counter that increases whenever any leaderboard row changes
+    """
+    with connection() as conn:
+        row = conn.execute("SELECT version FROM leaderboard_version WHERE id = 1").fetchone()
+
+    return row[0] if row else 0
+
+
+def get_evaluation_result(
+    question_set_version: str, solution_hash: str, config: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Return a stored evaluation of an identical solution, if there is one
+
+    Args:
+        question_set_version: Version of the question set evaluated against
+        solution_hash: Hash of the solution text
+        config: Model settings the results were produced with
+
+    Returns:
+        The per-question results, or None
+    """
+    with connection() as conn:
+        row = conn.execute(
+            """
+            SELECT results FROM evaluation_results
+            WHERE question_set_version = ? AND solution_hash = ? AND config = ?
+            """,
+            (question_set_version, solution_hash, config),
+        ).fetchone()
+
+    return json.loads(row[0]) if row else None
+
+
+def save_evaluation_result(
+    question_set_version: str,
+    solution_hash: str,
+    config: str,
+    score: int,
+    results: Dict[str, Any],
+):
+    """
+    Store a complete evaluation so identical solutions can reuse it
+
+    Args:
+        question_set_version: Version of the question set evaluated against
+        solution_hash: Hash of the solution text
+        config: Model settings the results were produced with
+        score: Number of correct answers
+        results: The per-question results
+    """
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO evaluation_results
+                (question_set_version, solution_hash, config, score, results, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                question_set_version,
+                solution_hash,
+                config,
+                score,
+                json.dumps(results, ensure_ascii=False),
+                datetime.now().isoformat(),
+            ),
+        )
@@ -0,0 +1,468 @@
+import os
+import time
+import queue
+import asyncio
+import sqlite3
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from metrics import DB_QUERY_SECONDS
+
+DB_PATH = os.getenv("LEADERBOARD_DB", "leaderboard.db")
+# Connections kept open per process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# Milliseconds a writer waits for a lock held by another connection or process
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Applied to every new connection. WAL lets readers proceed while a write is
+# in progress, and synchronous=NORMAL is durable enough in WAL mode.
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA foreign_keys=ON",
+]
+
+
+def _create_scores(conn: sqlite3.Connection):
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS scores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        finalScore INTEGER,
+        solution TEXT,
+        timestamp TEXT NOT NULL,
+        tries INTEGER DEFAULT 10
+    )
+    """
+    )
+
+    # Databases from before versioned migrations may lack these columns
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(scores)")]
+    if "tries" not in columns:
+        conn.execute("ALTER TABLE scores ADD COLUMN tries INTEGER DEFAULT 0")
+    if "finalScoreUpperBound" not in columns:
+        conn.execute("ALTER TABLE scores ADD COLUMN finalScoreUpperBound INTEGER")
+
+
+def _create_eval_jobs(conn: sqlite3.Connection):
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS eval_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        submission_id INTEGER,
+        name TEXT NOT NULL,
+        solution TEXT,
+        state TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        lease_owner TEXT,
+        lease_expires REAL,
+        last_error TEXT,
+        final_score INTEGER,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_eval_jobs_state ON eval_jobs(state, lease_expires)"
+    )
+
+
+def _create_score_indexes(conn: sqlite3.Connection):
+    # Latest tries per user and the latest-unscored lookup
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_name_timestamp ON scores(name, timestamp)")
+    # Best final score per user and final standings
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_name_final ON scores(name, finalScore)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_final ON scores(finalScore)")
+    # Best quick score per user
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_name_score ON scores(name, score)")
+
+
+def _create_leaderboard(conn: sqlite3.Connection):
+    # Best scores per user, kept up to date by every write to scores
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS leaderboard (
+        name TEXT PRIMARY KEY,
+        best_score INTEGER NOT NULL,
+        best_score_timestamp TEXT,
+        best_final_score INTEGER NOT NULL,
+        final_upper_bound INTEGER,
+        latest_timestamp TEXT
+    )
+    """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_leaderboard_score ON leaderboard(best_score)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_final ON leaderboard(best_final_score)"
+    )
+    # Bumped in the same transaction as every leaderboard change
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS leaderboard_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+    )
+    conn.execute("INSERT OR IGNORE INTO leaderboard_version (id, version) VALUES (1, 0)")
+
+    names = [row[0] for row in conn.execute("SELECT DISTINCT name FROM scores")]
+    for name in names:
+        refresh_leaderboard_entry(conn, name)
+
+
+def refresh_leaderboard_entry(conn: sqlite3.Connection, name: str):
+    """
+    Recompute one user's leaderboard row from their scores.
+
+    Must run inside the transaction that changed the scores. Only touches
+    that user's few rows through the (name, ...) indexes.
+    """
+    row = conn.execute(
+        """
+        SELECT
+            (SELECT score FROM scores WHERE name = :name ORDER BY score DESC LIMIT 1),
+            (SELECT timestamp FROM scores WHERE name = :name ORDER BY score DESC LIMIT 1),
+            (SELECT finalScore FROM scores WHERE name = :name ORDER BY finalScore DESC LIMIT 1),
+            (SELECT finalScoreUpperBound FROM scores WHERE name = :name ORDER BY finalScore DESC LIMIT 1),
+            (SELECT MAX(timestamp) FROM scores WHERE name = :name)
+        """,
+        {"name": name},
+    ).fetchone()
+
+    if row[0] is None:
+        conn.execute("DELETE FROM leaderboard WHERE name = ?", (name,))
+    else:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO leaderboard
+                (name, best_score, best_score_timestamp, best_final_score, final_upper_bound, latest_timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (name, row[0], row[1], row[2] or 0, row[3], row[4]),
+        )
+    conn.execute("UPDATE leaderboard_version SET version = version + 1 WHERE id = 1")
+
+
+def _add_question_set_versions(conn: sqlite3.Connection):
+    # Which question set produced the quick score and the final score
+    conn.execute("ALTER TABLE scores ADD COLUMN questionSetVersion TEXT")
+    conn.execute("ALTER TABLE scores ADD COLUMN finalQuestionSetVersion TEXT")
+
+
+def _create_user_quota(conn: sqlite3.Connection):
+    # Tries per user: used counts saved submissions, reserved the ones being evaluated
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS user_quota (
+        name TEXT PRIMARY KEY,
+        used INTEGER NOT NULL DEFAULT 0,
+        reserved INTEGER NOT NULL DEFAULT 0,
+        reserved_until REAL NOT NULL DEFAULT 0
+    )
+    """
+    )
+    # Carry over the tries recorded on each user's latest submission
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO user_quota (name, used)
+        SELECT name, (
+            SELECT COALESCE(tries, 0) FROM scores latest
+            WHERE latest.name = scores.name
+            ORDER BY timestamp DESC LIMIT 1
+        )
+        FROM scores
+        GROUP BY name
+        """
+    )
+
+
+def _create_evaluation_results(conn: sqlite3.Connection):
+    # Complete submission-level results, reused for identical solutions
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS evaluation_results (
+        question_set_version TEXT NOT NULL,
+        solution_hash TEXT NOT NULL,
+        config TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        results TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (question_set_version, solution_hash, config)
+    )
+    """
+    )
+
+
+def _add_usage_columns(conn: sqlite3.Connection):
+    # Model tokens and cost of the quick and the final evaluation
+    for prefix in ("", "final"):
+        for column, kind in (
+            ("PromptTokens", "INTEGER"),
+            ("CompletionTokens", "INTEGER"),
+            ("CachedTokens", "INTEGER"),
+            ("CostUsd", "REAL"),
+        ):
+            name = prefix + column if prefix else column[0].lower() + column[1:]
+            conn.execute(f"ALTER TABLE scores ADD COLUMN {name} {kind}")
+
+
+def _add_provisional_scores(conn: sqlite3.Connection):
+    # Estimate from a stratified sample, shown until the exact final score is in
+    conn.execute("ALTER TABLE scores ADD COLUMN provisionalScore INTEGER")
+    conn.execute("ALTER TABLE scores ADD COLUMN provisionalLow INTEGER")
+    conn.execute("ALTER TABLE scores ADD COLUMN provisionalHigh INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scores_provisional ON scores(name, provisionalScore) "
+        "WHERE provisionalScore IS NOT NULL AND finalQuestionSetVersion IS NULL"
+    )
+
+
+def _create_rescore_runs(conn: sqlite3.Connection):
+    # Offline re-scoring runs (python -m rescore) and their per-submission checkpoints
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS rescore_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        selection TEXT NOT NULL,
+        question_set_version TEXT NOT NULL,
+        config TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        finished_at TEXT
+    )
+    """
+    )
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS rescore_items (
+        run_id INTEGER NOT NULL REFERENCES rescore_runs(id),
+        score_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        solution TEXT,
+        final_score INTEGER,
+        updated_at TEXT,
+        PRIMARY KEY (run_id, score_id)
+    )
+    """
+    )
+
+
+def _create_question_outcomes(conn: sqlite3.Connection):
+    # Per-question outcome of every evaluation, and running aggregates per question
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS question_outcomes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_set_version TEXT NOT NULL,
+        question_id TEXT NOT NULL,
+        name TEXT,
+        predicted TEXT NOT NULL,
+        expected TEXT NOT NULL,
+        correct INTEGER NOT NULL,
+        latency REAL,
+        created_at TEXT NOT NULL
+    )
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_question_outcomes_question "
+        "ON question_outcomes(question_set_version, question_id)"
+    )
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS question_stats (
+        question_set_version TEXT NOT NULL,
+        question_id TEXT NOT NULL,
+        question TEXT NOT NULL,
+        expected TEXT NOT NULL,
+        answered INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        latency_sum REAL NOT NULL DEFAULT 0,
+        latency_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (question_set_version, question_id)
+    )
+    """
+    )
+    # One row per question and predicted label: the question's row of the confusion matrix
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS question_predictions (
+        question_set_version TEXT NOT NULL,
+        question_id TEXT NOT NULL,
+        predicted TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (question_set_version, question_id, predicted)
+    )
+    """
+    )
+
+
+# (version, description, migration). Applied in order, each in its own
+# transaction, and recorded in PRAGMA user_version. Only ever append.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "scores table", _create_scores),
+    (2, "evaluation job queue", _create_eval_jobs),
+    (3, "scores indexes", _create_score_indexes),
+    (4, "materialized leaderboard", _create_leaderboard),
+    (5, "question set versions on scores", _add_question_set_versions),
+    (6, "per-user quota counter", _create_user_quota),
+    (7, "stored evaluation results", _create_evaluation_results),
+    (8, "token usage and cost on scores", _add_usage_columns),
+    (9, "provisional final scores", _add_provisional_scores),
+    (10, "offline re-scoring checkpoints", _create_rescore_runs),
+    (11, "per-question outcomes and aggregates", _create_question_outcomes),
+]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # isolation_level=None leaves transaction control to transaction()
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=256,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Small pool of SQLite connections shared by all threads of a process.
+
+    Connections are reused, so pragmas are applied once and sqlite3's
+    per-connection statement cache keeps queries prepared between calls.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return _connect(self.path)
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection in autocommit mode, for reads"""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection inside a write transaction.
+
+        BEGIN IMMEDIATE takes the write lock up front, so read-then-write
+        sequences cannot interleave with another writer.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide connection pool for the leaderboard database"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def connection():
+    """Shortcut for get_pool().connection()"""
+    return get_pool().connection()
+
+
+def transaction():
+    """Shortcut for get_pool().transaction()"""
+    return get_pool().transaction()
+
+
+# Blocking database work runs here instead of on the event loop. One thread
+# per pooled connection, so a thread never waits for a connection.
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_in_db_thread(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking database function on the database threads"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_timed, fn, *args, **kwargs))
+
+
+def _timed(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        DB_QUERY_SECONDS.observe(
+            time.perf_counter() - started, query=getattr(fn, "__name__", "unknown")
+        )
+
+
+def migrate() -> int:
+    """
+    Bring the schema up to date
+
+    Returns:
+        The schema version after migrating
+    """
+    with connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        with transaction() as conn:
+            # Another process may have migrated while we waited for the lock
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current >= target:
+                version = current
+                continue
+            print(f"Migrating database to version {target}: {description}")
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+        version = target
+
+    return version
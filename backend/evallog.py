@@ -0,0 +1,320 @@
+"""
+Append-only evaluation log.
+
+Evaluation records are queued in memory and written by a background
+thread in batches to gzip-compressed JSONL segments under ``logs/``.
+Every batch is appended as its own gzip member, so a segment stays
+readable up to the last flushed batch even if the process dies. Each
+process writes its own segments, so the API and several workers can log
+into the same directory.
+
+Query the log with:
+
+    python -m evallog --user alice --min-score 100 --since 2025-01-01
+"""
+import os
+import glob
+import gzip
+import json
+import time
+import queue
+import atexit
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+LOG_DIR = os.getenv("EVAL_LOG_DIR", "logs")
+# Records written per batch at most
+LOG_BATCH_SIZE = int(os.getenv("EVAL_LOG_BATCH_SIZE", "256"))
+# Seconds a record may wait in the queue before it is flushed
+LOG_FLUSH_INTERVAL = float(os.getenv("EVAL_LOG_FLUSH_INTERVAL", "1.0"))
+# A segment is closed when it reaches this size or age
+LOG_SEGMENT_BYTES = int(os.getenv("EVAL_LOG_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+LOG_SEGMENT_SECONDS = float(os.getenv("EVAL_LOG_SEGMENT_SECONDS", "3600"))
+# Closed segments older than this are deleted (0 keeps them forever)
+LOG_RETENTION_DAYS = float(os.getenv("EVAL_LOG_RETENTION_DAYS", "30"))
+# Failed flushes retried on shutdown before the remaining records are spilled
+LOG_CLOSE_ATTEMPTS = int(os.getenv("EVAL_LOG_CLOSE_ATTEMPTS", "3"))
+# Long inputs are truncated in the log
+MAX_INPUT_CHARS = 500
+
+SEGMENT_PATTERN = "evaluations-*.jsonl.gz"
+
+
+def make_record(
+    freetext: str,
+    results: Dict[str, Any],
+    score: int,
+    name: Optional[str] = None,
+    question_set_version: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build a log record for one evaluation"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "name": name,
+        "input_text": (
+            freetext[:MAX_INPUT_CHARS] + "..." if len(freetext) > MAX_INPUT_CHARS else freetext
+        ),
+        "score": score,
+        "total": len(results),
+        "question_set_version": question_set_version,
+        "results": results,
+    }
+
+
+class EvaluationLogWriter:
+    """
+    Background writer for evaluation records.
+
+    ``write`` only puts the record on an unbounded queue, so it never
+    blocks the caller. A daemon thread drains the queue in batches. A batch
+    that fails to write is kept and retried on the next flush, and
+    ``close`` drains everything that is still queued. Records that still
+    cannot be written after LOG_CLOSE_ATTEMPTS failed flushes on shutdown
+    are spilled to a plain JSONL file instead of being dropped.
+    """
+
+    def __init__(
+        self,
+        directory: str = LOG_DIR,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+        segment_bytes: int = LOG_SEGMENT_BYTES,
+        segment_seconds: float = LOG_SEGMENT_SECONDS,
+        retention_days: float = LOG_RETENTION_DAYS,
+    ):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention_days = retention_days
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._pending: List[Dict[str, Any]] = []
+        self._segment: Optional[str] = None
+        self._segment_started = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Queue a record for writing"""
+        if self._thread is None:
+            self._start()
+        self._queue.put(record)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="evaluation-log", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush every queued record and stop the writer thread"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # A full batch left over from a failed write is retried without waiting
+            if len(self._pending) < self.batch_size:
+                try:
+                    # Wait for the first record, then take whatever else is queued
+                    record = self._queue.get(timeout=self.flush_interval)
+                    while True:
+                        if record is None:
+                            stopping = True
+                        else:
+                            self._pending.append(record)
+                        if len(self._pending) >= self.batch_size:
+                            break
+                        record = self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+            if self._pending:
+                self._flush()
+        failures = 0
+        while self._pending and failures < LOG_CLOSE_ATTEMPTS:
+            if not self._flush():
+                failures += 1
+        if self._pending:
+            self._spill()
+
+    def _spill(self):
+        """Write the records that could not be flushed to a fallback file"""
+        name = f"unwritten-{type(self).__name__}-{os.getpid()}-{int(time.time())}.jsonl"
+        count = len(self._pending)
+        for directory in (self.directory, tempfile.gettempdir()):
+            path = os.path.join(directory, name)
+            try:
+                os.makedirs(directory, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    for record in self._pending:
+                        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            except OSError:
+                continue
+            print(f"{count} records could not be written, saved them to {path}")
+            self._pending.clear()
+            return
+        print(f"{count} records could not be written and were lost")
+
+    def _flush(self) -> bool:
+        batch = self._pending[: self.batch_size]
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in batch
+        ).encode("utf-8")
+        try:
+            path = self._current_segment()
+            with gzip.open(path, "ab") as f:
+                f.write(data)
+        except OSError as e:
+            self.errors += 1
+            print(f"Evaluation log write failed, keeping {len(self._pending)} records: {e}")
+            time.sleep(self.flush_interval)
+            return False
+        del self._pending[: len(batch)]
+        self.written += len(batch)
+        self.batches += 1
+        return True
+
+    def _current_segment(self) -> str:
+        """Path of the segment to append to, rotating when it is too big or old"""
+        now = time.time()
+        if self._segment is not None:
+            too_old = now - self._segment_started >= self.segment_seconds
+            try:
+                too_big = os.path.getsize(self._segment) >= self.segment_bytes
+            except OSError:
+                too_big = False
+            if not (too_old or too_big):
+                return self._segment
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(now).strftime("%Y%m%dT%H%M%S")
+        self._segment = os.path.join(
+            self.directory, f"evaluations-{stamp}-{os.getpid()}-{int(now * 1000) % 1000:03d}.jsonl.gz"
+        )
+        self._segment_started = now
+        self._apply_retention(now)
+        return self._segment
+
+    def _apply_retention(self, now: float):
+        if self.retention_days <= 0:
+            return
+        cutoff = now - self.retention_days * 86400
+        for path in glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "queued": self._queue.qsize() + len(self._pending),
+            "segment": self._segment,
+        }
+
+
+log_writer = EvaluationLogWriter()
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def read_records(
+    directory: str = LOG_DIR,
+    name: Optional[str] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Read evaluation records from the log, oldest segment first
+
+    Args:
+        directory: Log directory
+        name: Only records for this user
+        min_score: Only records scoring at least this
+        max_score: Only records scoring at most this
+        since: Only records at or after this time
+        until: Only records before this time
+
+    Returns:
+        An iterator over matching records
+    """
+    for path in sorted(glob.glob(os.path.join(directory, SEGMENT_PATTERN))):
+        # Skip whole segments outside the time window
+        if since is not None and os.path.getmtime(path) < since.timestamp():
+            continue
+        stamp = os.path.basename(path).split("-")[1]
+        if until is not None and datetime.strptime(stamp, "%Y%m%dT%H%M%S") >= until:
+            continue
+
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if name is not None and record.get("name") != name:
+                        continue
+                    if min_score is not None and record["score"] < min_score:
+                        continue
+                    if max_score is not None and record["score"] > max_score:
+                        continue
+                    timestamp = datetime.fromisoformat(record["timestamp"])
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp >= until:
+                        continue
+                    yield record
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            # A batch cut short by a crash ends the segment
+            continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the evaluation log")
+    parser.add_argument("--dir", default=LOG_DIR, help="Log directory")
+    parser.add_argument("--user", help="Only records for this user")
+    parser.add_argument("--min-score", type=int, help="Only records scoring at least this")
+    parser.add_argument("--max-score", type=int, help="Only records scoring at most this")
+    parser.add_argument("--since", help="ISO date or time, inclusive")
+    parser.add_argument("--until", help="ISO date or time, exclusive")
+    parser.add_argument("--limit", type=int, help="Stop after this many records")
+    parser.add_argument("--full", action="store_true", help="Include per-question results")
+    args = parser.parse_args()
+
+    records = read_records(
+        args.dir,
+        name=args.user,
+        min_score=args.min_score,
+        max_score=args.max_score,
+        since=_parse_time(args.since),
+        until=_parse_time(args.until),
+    )
+    for count, record in enumerate(records, 1):
+        if not args.full:
+            record.pop("results", None)
+        print(json.dumps(record, ensure_ascii=False))
+        if args.limit is not None and count >= args.limit:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,400 @@
-import csv
 import os
-import json
+import sys
+import time
 import asyncio
+import functools
 import logging
-from typing import Dict, List, Tuple, Any, Optional
-from models import OpenAIResponse
-import os
-from openai import OpenAI, AsyncOpenAI
-import tqdm
+from typing import Callable, Dict, List, Tuple, Any, Optional
+from cache import classification_cache, make_key, CACHE_ENABLED
+from backends import ClassifierBackend, ChatBackend, BatchBackend, FakeBackend, LocalBatchBackend
+from questions import QuestionSet, get_question_set, normalize_label
+from ratelimit import count_tokens
+from resilience import call_with_retries
+from scheduler import scheduler, current_lane, INTERACTIVE
+from metrics import (
+    MODEL_CALL_SECONDS,
+    MODEL_CALL_ERRORS,
+    MODEL_CALL_RETRIES,
+    MODEL_CALLS_IN_FLIGHT,
+    EVALUATION_SECONDS,
+    EVALUATIONS_IN_PROGRESS,
+    CLASSIFICATION_FALLBACKS,
+)
+from clients import get_client, close_client
+
+MODEL = "gpt-4o"
+TEMPERATURE = 0.0
+SEED = 42
+
+# Maximum number of model calls in flight for a single evaluation
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+# Time limit in seconds for classifying all questions of one evaluation
+EVAL_DEADLINE_SECONDS = float(os.getenv("EVAL_DEADLINE_SECONDS", "300"))
+
+# Questions packed into one model call; 1 sends one request per question
+EVAL_PACK_SIZE = int(os.getenv("EVAL_PACK_SIZE", "1"))
+
+# Upstream prompt caching only applies to prompts of at least this many tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+# Send the first call of a long prompt alone so the others hit the prompt cache.
+# Never done for interactive quick checks, where it would add a round trip.
+PROMPT_CACHE_WARMUP = os.getenv("PROMPT_CACHE_WARMUP", "1") == "1"
+
+# Backend for interactive evaluation ("chat" or "fake") and for bulk re-scoring
+# ("batch", "chat", "fake", or "local-batch" to run the batch path offline)
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "chat")
+BULK_BACKEND = os.getenv("BULK_BACKEND", "batch")
+
+_backends: Dict[str, ClassifierBackend] = {}
+
+
+def create_backend(kind: str) -> ClassifierBackend:
+    """Build a classifier backend by name"""
+    if kind == "chat":
+        return ChatBackend(get_client(), MODEL, TEMPERATURE, SEED)
+    if kind == "batch":
+        return BatchBackend(get_client(), MODEL, TEMPERATURE, SEED)
+    if kind == "fake":
+        return FakeBackend()
+    if kind == "local-batch":
+        return LocalBatchBackend(MODEL, TEMPERATURE, SEED)
+    raise ValueError(f"Unknown classifier backend: {kind}")
+
+
+def get_backend(kind: Optional[str] = None) -> ClassifierBackend:
+    """Return the shared backend of the given kind (default CLASSIFIER_BACKEND)"""
+    kind = kind or CLASSIFIER_BACKEND
+    if kind not in _backends:
+        _backends[kind] = create_backend(kind)
+    return _backends[kind]
+
+
+def backend_name(kind: Optional[str] = None) -> str:
+    """Name of the backend that serves ``kind`` (default CLASSIFIER_BACKEND), without building it"""
+    kind = kind or CLASSIFIER_BACKEND
+    backend = _backends.get(kind)
+    return backend.name if backend is not None else kind
+
+
+def set_backend(backend: ClassifierBackend, kind: Optional[str] = None):
+    """Replace the shared backend, e.g. with a FakeBackend in benchmarks"""
+    _backends[kind or CLASSIFIER_BACKEND] = backend
+
+
+async def close_backends():
+    """Drop the live backends and close the shared client's connections"""
+    for kind in ("chat", "batch"):
+        _backends.pop(kind, None)
+    await close_client()
+
+
+def load_questions(filename: str) -> QuestionSet:
+    """
+    Load questions and classifications from CSV file
+
+    Served from the question-set registry, so the file is only parsed again
+    when it changes. The result maps question text to normalized label.
+    """
+    return get_question_set(filename)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def question_list(questions) -> List[str]:
+    """Return the question texts in evaluation order.
+
+    Accepts either a dict mapping question->classification or a list of
+    (question, classification) tuples.
+    """
+    if hasattr(questions, "keys"):
+        return list(questions.keys())
+    return [question for question, _ in questions]
+
+
+async def _timed_call(backend: ClassifierBackend, kind: str, call, *args):
+    """Run one backend call in a scheduler slot, recording latency, errors and in-flight calls"""
+    async with scheduler.slot():
+        MODEL_CALLS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            return await call(*args)
+        except Exception:
+            MODEL_CALL_ERRORS.inc(backend=backend.name, kind=kind)
+            raise
+        finally:
+            MODEL_CALLS_IN_FLIGHT.dec()
+            MODEL_CALL_SECONDS.observe(
+                time.perf_counter() - started, backend=backend.name, kind=kind
+            )
 
 
-def normalize_label(label: str) -> str:
-    """Normalize labels to canonical form for comparison."""
-    if label is None:
-        return ""
-    l = label.strip().lower()
-    if l in {"mcp agent", "innsiktsmodul", "innsikt"}:
-        return "innsiktsmodulen"
-    if l in {"support ai", "support-ai", "supportai"}:
-        return "supportai"
-    return l
+def _retryable(error: Exception) -> bool:
+    """Requests the API rejected outright fail the same way when repeated"""
+    # The SDK is only loaded once a live client exists; no other error comes from it
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return True
+    return not isinstance(
+        error,
+        (
+            openai.BadRequestError,
+            openai.AuthenticationError,
+            openai.PermissionDeniedError,
+            openai.NotFoundError,
+        ),
+    )
+
+
+async def classify_question(
+    user_input: str, question: str, backend: Optional[ClassifierBackend] = None
+) -> str:
+    """
+    Classify a single question with the user's prompt as system message.
 
+    Answers are deterministic for a given backend source, model, prompt,
+    question, seed and temperature, so they are served from the
+    classification cache when seen before.
+    """
+    backend = backend or get_backend()
+    if CACHE_ENABLED:
+        key = make_key(backend.cache_source, MODEL, user_input, question, SEED, TEMPERATURE)
+        cached = await classification_cache.aget(key)
+        if cached is not None:
+            return cached
+
+    classification = await call_with_retries(
+        lambda: _timed_call(backend, "single", backend.classify, user_input, question),
+        "single",
+        _retryable,
+    )
+    if CACHE_ENABLED:
+        await classification_cache.aput(key, MODEL, classification)
+    return classification
+
+
+async def classify_packed(
+    user_input: str,
+    questions: List[Tuple[int, str]],
+    backend: Optional[ClassifierBackend] = None,
+) -> Dict[int, str]:
+    """
+    Classify several (index, question) pairs in one model call.
 
-def load_questions(filename: str) -> dict[str, str]:
-    """Load questions and classifications from CSV file"""
-    questions = {}
+    Packed answers are cached separately from single-question answers since
+    the model sees other questions alongside each one.
 
-    if not os.path.exists(filename):
-        return questions
+    Returns:
+        Classification per index. Indices the model left out are missing.
+    """
+    backend = backend or get_backend()
+    packed_model = f"{MODEL}:packed"
+    answers: Dict[int, str] = {}
+    pending: List[Tuple[int, str]] = []
+    for i, question in questions:
+        if CACHE_ENABLED:
+            cached = await classification_cache.aget(
+                make_key(
+                    backend.cache_source, packed_model, user_input, question, SEED, TEMPERATURE
+                )
+            )
+            if cached is not None:
+                answers[i] = cached
+                continue
+        pending.append((i, question))
+
+    if pending:
+        returned = await call_with_retries(
+            lambda: _timed_call(backend, "packed", backend.classify_packed, user_input, pending),
+            "packed",
+            _retryable,
+        )
+        for i, question in pending:
+            if i not in returned:
+                continue
+            answers[i] = returned[i]
+            if CACHE_ENABLED:
+                await classification_cache.aput(
+                    make_key(
+                        backend.cache_source, packed_model, user_input, question, SEED, TEMPERATURE
+                    ),
+                    packed_model,
+                    returned[i],
+                )
+    return answers
 
-    with open(filename, "r", encoding="utf-8") as f:
-        reader = csv.reader(f, delimiter=";")
-        next(reader)  # Skip header
-        for row in reader:
-            if len(row) >= 2:
-                question_text = row[0].strip()
-                expected_label = normalize_label(row[1])
-                questions[question_text] = expected_label
 
-    return questions
+async def _first_uncached(
+    user_input: str, texts: List[str], backend: Optional[ClassifierBackend], packed: bool
+) -> Optional[int]:
+    """Index of the first question without a cached answer, or None if all are cached"""
+    if not CACHE_ENABLED:
+        return 0
+    backend = backend or get_backend()
+    model = f"{MODEL}:packed" if packed else MODEL
+    return await classification_cache.afirst_missing(
+        [
+            make_key(backend.cache_source, model, user_input, question, SEED, TEMPERATURE)
+            for question in texts
+        ]
+    )
 
 
 async def call_openai_api(
-    user_input: str, questions: List[Tuple[str, str]]
-) -> Dict[str, Dict[str, str]]:
+    user_input: str,
+    questions: List[Tuple[str, str]],
+    concurrency: Optional[int] = None,
+    deadline: Optional[float] = None,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    backend: Optional[ClassifierBackend] = None,
+    pack_size: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
     """
     Call the OpenAI API with the user's input and questions
 
+    Questions are classified concurrently, with at most ``concurrency`` calls
+    in flight. Each call is retried with backoff on its own (see
+    resilience.call_with_retries). A question that still fails, or is not
+    done within ``deadline`` seconds, is answered "?" while every completed
+    answer is kept. With ``pack_size`` above 1, that many questions are sent
+    per call; any the model leaves out, or a whole pack that fails, are
+    retried one question at a time.
+
     Args:
         user_input: The user's input text
         questions: List of (question, classification) tuples
+        concurrency: Maximum number of in-flight calls (default EVAL_CONCURRENCY)
+        deadline: Time limit in seconds for the whole run (default EVAL_DEADLINE_SECONDS)
+        on_result: Called with (key, result) as soon as each question completes
+        backend: Classifier backend to use (default get_backend())
+        pack_size: Questions per call (default EVAL_PACK_SIZE)
 
     Returns:
-        The OpenAI API response as a dictionary, or None if the call fails
+        The OpenAI API response as a dictionary keyed by str(i) in question
+        order, with per-question latency in seconds, or None if the call fails
     """
+    concurrency = concurrency or EVAL_CONCURRENCY
+    deadline = deadline if deadline is not None else EVAL_DEADLINE_SECONDS
+    pack_size = pack_size or EVAL_PACK_SIZE
+
     try:
-        # Prepare messages and process sequentially (no concurrency)
+        texts = question_list(questions)
         results = {}
+        semaphore = asyncio.Semaphore(max(1, concurrency))
 
-        print("Evaluating questions (sequential)...")
-
-        # Support when questions is a dict mapping question->classification
-        iterator = (
-            enumerate(questions.items())
-            if hasattr(questions, "items")
-            else enumerate(questions)
-        )
-
-        for i, item in iterator:
-            if hasattr(questions, "items"):
-                question, _ = item
-            else:
-                question, _ = item  # assume tuple(question, classification)
-
-            messages = [
-                {"role": "system", "content": f"{user_input}"},
-                {"role": "user", "content": f"{question}"},
-            ]
+        print(f"Evaluating {len(texts)} questions (concurrency {concurrency})...")
 
-            response = await async_client.beta.chat.completions.parse(
-                model="gpt-4o",
-                messages=messages,
-                response_format=OpenAIResponse,
-                temperature=0.0,
-                seed=42,
-            )
-
-            classification = json.loads(response.choices[0].message.content)["response"]
+        def _record(i: int, question: str, classification: str, latency: Optional[float]):
             results[str(i)] = {
                 "classification": classification.strip(),
                 "question": question.strip(),
+                "latency": latency,
             }
-            print(f"Completed {i + 1}", end="\r")
-
-        return results
+            print(f"Completed {len(results)}", end="\r")
+            if on_result is not None:
+                on_result(str(i), results[str(i)])
+
+        def _give_up(i: int, question: str, reason: str):
+            CLASSIFICATION_FALLBACKS.inc(reason=reason)
+            _record(i, question, "?", None)
+
+        async def _run(i: int, question: str):
+            try:
+                async with semaphore:
+                    started = time.perf_counter()
+                    classification = await classify_question(user_input, question, backend)
+                    latency = time.perf_counter() - started
+            except Exception as e:
+                print(f"Question {i} failed after retries: {e}")
+                _give_up(i, question, "call_failed")
+                return
+            _record(i, question, classification, latency)
+
+        async def _run_pack(group: List[Tuple[int, str]]):
+            try:
+                async with semaphore:
+                    started = time.perf_counter()
+                    answers = await classify_packed(user_input, group, backend)
+                    latency = time.perf_counter() - started
+            except Exception as e:
+                print(f"Packed call failed after retries: {e}")
+                answers, latency = {}, None
+
+            missing = []
+            for i, question in group:
+                if i in answers:
+                    _record(i, question, answers[i], latency)
+                else:
+                    missing.append((i, question))
+
+            if missing:
+                print(f"{len(missing)} questions missing from packed response, retrying singly")
+                MODEL_CALL_RETRIES.inc(
+                    len(missing), reason="packed_missing" if answers else "packed_failed"
+                )
+                async with asyncio.TaskGroup() as fallback:
+                    for i, question in missing:
+                        fallback.create_task(_run(i, question))
+
+        if pack_size > 1:
+            indexed = list(enumerate(texts))
+            calls = [
+                functools.partial(_run_pack, indexed[start : start + pack_size])
+                for start in range(0, len(indexed), pack_size)
+            ]
+        else:
+            calls = [functools.partial(_run, i, question) for i, question in enumerate(texts)]
+
+        try:
+            async with asyncio.timeout(deadline):
+                # A long prompt goes out once on its own first, so the rest of
+                # the evaluation can read it from the upstream prompt cache
+                if (
+                    PROMPT_CACHE_WARMUP
+                    and len(calls) > 1
+                    and current_lane.get() != INTERACTIVE
+                    and count_tokens(user_input) >= PROMPT_CACHE_MIN_TOKENS
+                ):
+                    first = await _first_uncached(user_input, texts, backend, pack_size > 1)
+                    # Nothing to warm up when every answer is already cached
+                    if first is not None:
+                        await calls.pop(first // pack_size)()
+                async with asyncio.TaskGroup() as tg:
+                    for call in calls:
+                        tg.create_task(call())
+        except TimeoutError:
+            unfinished = len(texts) - len(results)
+            print(f"Evaluation exceeded deadline of {deadline}s, {unfinished} questions unanswered")
+            for i, question in enumerate(texts):
+                if str(i) not in results:
+                    _give_up(i, question, "deadline")
+
+        # Return in question order, which parse_openai_response relies on
+        return {str(i): results[str(i)] for i in range(len(texts))}
 
     except Exception as e:
         print(f"Exception when calling OpenAI API: {str(e)}")
         return None
 
 
+def parse_result(value: Dict[str, Any], questions: dict[str, str]) -> Dict[str, Any]:
+    """Score a single classification against the expected label"""
+    classification = value["classification"]
+    question = value["question"].strip()
+    expected_label = questions[question]
+    predicted = normalize_label(classification)
+    expected = normalize_label(expected_label)
+    correct = predicted == expected
+    if not correct:
+        logging.error(
+            f"Incorrect classification: '{classification}' vs expected '{expected_label}' for question: {question}"
+        )
+    return {
+        "question": question,
+        "classification": classification,
+        "expected": expected_label,
+        "correct": correct,
+        "latency": value.get("latency"),
+    }
+
+
 async def parse_openai_response(
     response: dict[str, dict[str, str]], questions: dict[str, str]
 ) -> Dict[str, Dict[str, Any]]:
@@ -119,22 +411,7 @@ async def parse_openai_response(
     results = {}
     try:
         for key, value in response.items():
-            classification = value["classification"]
-            question = value["question"].strip()
-            expected_label = questions[question]
-            predicted = normalize_label(classification)
-            expected = normalize_label(expected_label)
-            correct = predicted == expected
-            if not correct:
-                logging.error(
-                    f"Incorrect classification: '{classification}' vs expected '{expected_label}' for question: {question}"
-                )
-            results[key] = {
-                "question": question,
-                "classification": classification,
-                "expected": expected_label,
-                "correct": correct,
-            }
+            results[key] = parse_result(value, questions)
     except Exception as e:
         print(f"Exception when parsing OpenAI API response: {str(e)}")
         results = {}
@@ -142,7 +419,12 @@ async def parse_openai_response(
     return results
 
 
-async def evaluate(system_prompt: str, questions) -> Dict[str, Dict[str, Any]]:
+async def evaluate(
+    system_prompt: str,
+    questions,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    backend: Optional[ClassifierBackend] = None,
+) -> Dict[str, Dict[str, Any]]:
     """
     Evaluate free text against known questions using OpenAI API.
     If API call fails, falls back to random classifications.
@@ -150,12 +432,33 @@ async def evaluate(system_prompt: str, questions) -> Dict[str, Dict[str, Any]]:
     Args:
         system_prompt: The free text input from the user
         questions: The questions to evaluate against
+        on_result: Called with (key, parsed result) as each question completes
+        backend: Classifier backend to use (default get_backend())
 
     Returns:
         A dictionary mapping question keys to evaluation results
     """
 
-    response: dict[str, dict[str, str]] = await call_openai_api(system_prompt, questions)
+    def _on_raw_result(key: str, value: Dict[str, Any]):
+        try:
+            parsed = parse_result(value, questions)
+        except Exception as e:
+            print(f"Exception when parsing OpenAI API response: {str(e)}")
+            return
+        on_result(key, parsed)
+
+    EVALUATIONS_IN_PROGRESS.inc()
+    started = time.perf_counter()
+    try:
+        response: dict[str, dict[str, str]] = await call_openai_api(
+            system_prompt,
+            questions,
+            on_result=_on_raw_result if on_result else None,
+            backend=backend,
+        )
+    finally:
+        EVALUATIONS_IN_PROGRESS.dec()
+        EVALUATION_SECONDS.observe(time.perf_counter() - started, questions=str(len(questions)))
 
     # Parse the response
     if response:
@@ -163,6 +466,7 @@ async def evaluate(system_prompt: str, questions) -> Dict[str, Dict[str, Any]]:
         return parsed_data
 
     # Fallback to random results if API call is not possible or fails
+    CLASSIFICATION_FALLBACKS.inc(len(questions), reason="evaluation_failed")
     results = {}
     for key, value in questions.items():
         results[key] = {
@@ -172,3 +476,71 @@ async def evaluate(system_prompt: str, questions) -> Dict[str, Dict[str, Any]]:
         }
 
     return results
+
+
+async def evaluate_bulk(
+    system_prompts: List[str], questions, backend: Optional[ClassifierBackend] = None
+) -> List[Dict[str, Dict[str, Any]]]:
+    """
+    Evaluate many prompts against the same questions as a single bulk job.
+
+    Every (prompt, question) pair that is not already cached is sent to the
+    backend in one ``classify_many`` call. Pairs the backend could not answer
+    are marked "?" and scored incorrect.
+
+    Args:
+        system_prompts: The prompts to evaluate
+        questions: The questions to evaluate against
+        backend: Classifier backend to use (default get_backend(BULK_BACKEND))
+
+    Returns:
+        One parsed result dict per prompt, in the same order
+    """
+    backend = backend or get_backend(BULK_BACKEND)
+    texts = question_list(questions)
+    answers: Dict[Tuple[str, str], str] = {}
+    pending: List[Tuple[str, str]] = []
+
+    for prompt in dict.fromkeys(system_prompts):
+        for question in texts:
+            if CACHE_ENABLED:
+                cached = await classification_cache.aget(
+                    make_key(backend.cache_source, MODEL, prompt, question, SEED, TEMPERATURE)
+                )
+                if cached is not None:
+                    answers[(prompt, question)] = cached
+                    continue
+            pending.append((prompt, question))
+
+    if pending:
+        print(f"Submitting {len(pending)} requests to the {backend.name} backend...")
+        classifications = await backend.classify_many(pending)
+        for (prompt, question), classification in zip(pending, classifications):
+            if classification is None:
+                continue
+            answers[(prompt, question)] = classification
+            if CACHE_ENABLED:
+                await classification_cache.aput(
+                    make_key(backend.cache_source, MODEL, prompt, question, SEED, TEMPERATURE),
+                    MODEL,
+                    classification,
+                )
+
+    missing = sum(
+        (prompt, question) not in answers for prompt in system_prompts for question in texts
+    )
+    if missing:
+        CLASSIFICATION_FALLBACKS.inc(missing, reason="bulk_missing")
+
+    results = []
+    for prompt in system_prompts:
+        response = {
+            str(i): {
+                "classification": answers.get((prompt, question), "?"),
+                "question": question.strip(),
+                "latency": None,
+            }
+            for i, question in enumerate(texts)
+        }
+        results.append(await parse_openai_response(response, questions))
+    return results
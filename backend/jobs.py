@@ -0,0 +1,130 @@
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from db import connection, transaction
+
+# Seconds a worker may hold a job before another worker can reclaim it
+LEASE_SECONDS = 120
+# Attempts before a job is given up on and marked failed
+MAX_ATTEMPTS = 3
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def enqueue_final_eval(
+    name: str, solution: Optional[str], submission_id: Optional[int] = None
+) -> int:
+    """
+    Queue a full test-set evaluation of a submission
+
+    Args:
+        name: User's name
+        solution: The user's solution text
+        submission_id: The scores row the final score belongs to
+
+    Returns:
+        The ID of the queued job
+    """
+    now = datetime.now().isoformat()
+    with transaction() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO eval_jobs (submission_id, name, solution, state, max_attempts, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (submission_id, name, solution, QUEUED, MAX_ATTEMPTS, now, now),
+        )
+        return cursor.lastrowid
+
+
+def claim_job(worker_id: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+    """
+    Atomically lease the oldest runnable job.
+
+    A job is runnable when it is queued, or when its lease has expired
+    because the worker holding it died. Expired jobs that have used up their
+    attempts are marked failed instead of being handed out again.
+
+    Returns:
+        The leased job as a dict, or None if there is nothing to do
+    """
+    now = time.time()
+    stamp = datetime.now().isoformat()
+
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE eval_jobs
+            SET state = ?, last_error = 'lease expired', updated_at = ?
+            WHERE state = ? AND lease_expires < ? AND attempts >= max_attempts
+            """,
+            (FAILED, stamp, LEASED, now),
+        )
+
+        row = conn.execute(
+            """
+            UPDATE eval_jobs
+            SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+            WHERE id = (
+                SELECT id FROM eval_jobs
+                WHERE state = ? OR (state = ? AND lease_expires < ?)
+                ORDER BY id
+                LIMIT 1
+            )
+            RETURNING id, submission_id, name, solution, attempts
+            """,
+            (LEASED, worker_id, now + lease_seconds, stamp, QUEUED, LEASED, now),
+        ).fetchone()
+
+    return dict(row) if row else None
+
+
+def renew_lease(job_id: int, worker_id: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+    """Extend a lease held by this worker. Returns False if it was lost"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE eval_jobs SET lease_expires = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+            (time.time() + lease_seconds, job_id, LEASED, worker_id),
+        )
+    return cursor.rowcount > 0
+
+
+def complete_job(job_id: int, worker_id: str, final_score: int) -> bool:
+    """Mark a leased job as done"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE eval_jobs
+            SET state = ?, final_score = ?, lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (DONE, final_score, datetime.now().isoformat(), job_id, worker_id),
+        )
+    return cursor.rowcount > 0
+
+
+def fail_job(job_id: int, worker_id: str, error: str):
+    """Return a job to the queue, or mark it failed once out of attempts"""
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE eval_jobs
+            SET state = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,
+                last_error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (FAILED, QUEUED, error, datetime.now().isoformat(), job_id, worker_id),
+        )
+
+
+def job_counts() -> Dict[str, int]:
+    """Number of jobs in each state"""
+    with connection() as conn:
+        rows = conn.execute("SELECT state, COUNT(*) FROM eval_jobs GROUP BY state").fetchall()
+    counts = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+    counts.update({row[0]: row[1] for row in rows})
+    return counts
@@ -1,23 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import os
+import json
+import time
 import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
 
 # Import local modules
-from models import User, SubmissionResponse, LeaderboardEntry
+from models import User, AnswerResult, SubmissionResponse, LeaderboardEntry
 from auth import authenticate_user
-from database import (
+from async_database import (
     init_db,
     save_submission,
-    get_leaderboard,
-    get_top_three,
     update_submission,
+    save_provisional_score,
     get_latest_unscored_submissions,
+    get_best_final_scores,
+    get_final_standings,
+    enqueue_final_eval,
+    job_counts,
+    reserve_try,
+    release_try,
 )
-from test_evaluate import test_evaluate
+from admission import admission
+from jobs import QUEUED
+from test_evaluate import test_evaluate, save_evaluation_log
 from utils import generate_test_questions, ensure_data_dir
-from evaluate import load_questions
-import sqlite3
+from evaluate import load_questions, evaluate_bulk, get_backend, close_backends
+from questions import QuestionSet
+from ratelimit import rate_limiter, count_tokens
+from ranking import score_with_pruning
+from sampling import PROVISIONAL_SAMPLE_SIZE, estimate_score, merge_results
+from singleflight import evaluate_once
+from usage import Usage, track_usage
+from scheduler import scheduler, model_lane, INTERACTIVE, BULK
+from snapshots import snapshot_cache, etag_for, BUILDERS
+from broadcast import broadcaster, LEADERBOARD_HEARTBEAT_SECONDS
+from evallog import log_writer
+from analytics import outcome_writer, get_question_analytics
+from metrics import render as render_metrics, FINAL_EVALUATIONS_QUEUED, BACKGROUND_TASKS, EVALUATION_LOG_QUEUED
+from db import run_in_db_thread
 
 
 # Initialize the FastAPI app
@@ -30,18 +54,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize everything needed on startup"""
-    init_db()
+    await init_db()
+    # Build the classifier backend, and the model client behind it, before the first request
+    get_backend()
     ensure_data_dir()
     if not os.path.exists("data/test_questions.csv"):
         generate_test_questions()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the model client and flush queued evaluation log records"""
+    await close_backends()
+    await asyncio.to_thread(log_writer.close)
+    await asyncio.to_thread(outcome_writer.close)
+
+
 # API Routes
 @app.post("/login")
 async def login(user: User):
@@ -60,13 +95,22 @@ async def login(user: User):
     return {"name": user.name}
 
 
-@app.post("/submit", response_model=SubmissionResponse)
-async def submit_response(user: User):
-    """Submit a solution and get evaluation results"""
-    # Authenticate the user
-    # name = authenticate_user(user.name, user.password)
-    name = user.name
+# Largest solution accepted, in estimated tokens; it is sent with every question
+MAX_SOLUTION_TOKENS = int(os.getenv("MAX_SOLUTION_TOKENS", "4000"))
 
+
+def _check_token_budget(solution: Optional[str]):
+    """Reject oversized solutions before any model call is made"""
+    tokens = count_tokens(solution or "")
+    if tokens > MAX_SOLUTION_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Solution is about {tokens} tokens, the limit is {MAX_SOLUTION_TOKENS}",
+        )
+
+
+async def _reserve_try(name: str) -> int:
+    """Reserve one of the user's tries, or raise if none are left"""
     # If authentication fails, return 401
     if name is None:
         raise HTTPException(
@@ -75,48 +119,93 @@ async def submit_response(user: User):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Check the current number of tries
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT tries FROM scores WHERE name = ? ORDER BY timestamp DESC LIMIT 1",
-        (name,),
-    )
-    row = cursor.fetchone()
-    tries = row[0] if row else 0
-    print(f"Tries: {tries}")
-
-    if tries >= 5:
+    # Atomically take a try; concurrent submits cannot both get the last one
+    tries = await reserve_try(name)
+    if tries is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Maximum number of tries exceeded",
         )
-    # Load example questions and evaluate only a small, fast subset (20)
-    check_questions = load_questions("data/check_questions.csv")
-    quick_questions = (
-        dict(list(check_questions.items())[:20]) if hasattr(check_questions, "items") else check_questions
-    )
+    print(f"Tries: {tries}")
+    return tries
+
 
-    # Evaluate the solution quickly (non-blocking size)
-    evaluation = await test_evaluate(user.solution or "", quick_questions)
+# Queued final evaluations, re-read at most once per second for admission control
+_queued_final = {"count": 0, "checked": 0.0}
 
+
+async def _admit():
+    """Take an evaluation slot, or answer 429 with Retry-After when the backlog is full"""
+    if admission.max_queued_final and time.monotonic() - _queued_final["checked"] > 1.0:
+        _queued_final["count"] = (await job_counts())[QUEUED]
+        _queued_final["checked"] = time.monotonic()
+
+    retry_after = admission.admit(_queued_final["count"])
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many evaluations in progress, try again shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def _evaluation_failed(evaluation: dict) -> bool:
+    """True when the model answered none of the questions, so the try should not count"""
+    results = evaluation["results"].values()
+    return bool(results) and all(result["classification"] == "?" for result in results)
+
+
+async def _quick_questions() -> QuestionSet:
+    """Load example questions and keep only a small, fast subset (20)"""
+    check_questions = await asyncio.to_thread(load_questions, "data/check_questions.csv")
+    return check_questions.head(20)
+
+
+async def _record_submission(
+    name: str, solution: str, evaluation: dict, question_set_version: Optional[str]
+):
+    """Save the quick score and queue the final evaluation"""
     # Save submission to database with initial score
-    save_submission(
+    submission_id = await save_submission(
         name=name,
         score=evaluation["score"],
-        solution=user.solution,
+        solution=solution,
+        question_set_version=question_set_version,
+        usage=evaluation["usage"],
     )
 
-    # Kick off background final evaluation of the full test set (non-blocking)
-    async def _run_final_eval(name: str, solution: str):
-        try:
-            test_questions = load_questions("data/test_questions.csv")
-            final_eval = await test_evaluate(solution or "", test_questions)
-            update_submission(name, solution or "", final_eval["score"])
-        except Exception as e:
-            print(f"Background final evaluation error: {e}")
+    # Queue the final evaluation of the full test set for the worker (python -m worker)
+    await enqueue_final_eval(name, solution or "", submission_id)
 
-    asyncio.create_task(_run_final_eval(name, user.solution or ""))
+
+@app.post("/submit", response_model=SubmissionResponse)
+async def submit_response(user: User):
+    """Submit a solution and get evaluation results"""
+    # Authenticate the user
+    # name = authenticate_user(user.name, user.password)
+    name = user.name
+    _check_token_budget(user.solution)
+    await _admit()
+    started = time.perf_counter()
+    try:
+        tries = await _reserve_try(name)
+        try:
+            # Evaluate the solution quickly (non-blocking size)
+            quick_questions = await _quick_questions()
+            with model_lane(INTERACTIVE, name):
+                evaluation = await test_evaluate(user.solution or "", quick_questions, name=name)
+            if _evaluation_failed(evaluation):
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Evaluation failed, the try was not counted",
+                    headers={"Retry-After": str(admission.retry_after())},
+                )
+            await _record_submission(name, user.solution, evaluation, quick_questions.version)
+        except BaseException:
+            await release_try(name)
+            raise
+    finally:
+        admission.release(time.perf_counter() - started)
 
     # Return the evaluation results
     response = SubmissionResponse(
@@ -125,80 +214,417 @@ async def submit_response(user: User):
     return response
 
 
+def _sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _StreamWithCleanup(StreamingResponse):
+    """Streaming response that runs ``cleanup`` when it ends, even if the body never started"""
+
+    def __init__(self, content, cleanup: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self.cleanup = cleanup
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.cleanup()
+
+
+@app.post("/submit/stream")
+async def submit_response_stream(user: User):
+    """
+    Submit a solution and stream evaluation results as Server-Sent Events.
+
+    Emits one ``result`` event per question as soon as it is classified,
+    then a ``summary`` event with the score and number of uses.
+    """
+    name = user.name
+    _check_token_budget(user.solution)
+    await _admit()
+    started = time.perf_counter()
+    tries = None
+    try:
+        tries = await _reserve_try(name)
+        quick_questions = await _quick_questions()
+    except BaseException:
+        if tries is not None:
+            await release_try(name)
+        admission.release()
+        raise
+
+    recorded = False
+    released = False
+
+    async def _release():
+        """Give back the admission slot, and the try unless it was used; runs once"""
+        nonlocal released
+        if released:
+            return
+        released = True
+        # Before any await, so a cancelled stream cannot skip it
+        admission.release(time.perf_counter() - started)
+        if not recorded:
+            await asyncio.shield(release_try(name))
+
+    async def _events():
+        nonlocal recorded
+        results: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        def _on_result(key: str, result: dict):
+            answer = AnswerResult(**result)
+            results.put_nowait({"key": key, **answer.model_dump()})
+
+        async def _evaluate():
+            try:
+                return await test_evaluate(
+                    user.solution or "", quick_questions, _on_result, name=name
+                )
+            finally:
+                results.put_nowait(finished)
+
+        with model_lane(INTERACTIVE, name):
+            evaluation_task = asyncio.create_task(_evaluate())
+        try:
+            while (item := await results.get()) is not finished:
+                yield _sse("result", item)
+
+            evaluation = evaluation_task.result()
+            if _evaluation_failed(evaluation):
+                yield _sse("error", {"detail": "Evaluation failed, the try was not counted"})
+                return
+            await _record_submission(name, user.solution, evaluation, quick_questions.version)
+            recorded = True
+            yield _sse("summary", {"score": evaluation["score"], "num_uses": tries + 1})
+        except Exception as e:
+            print(f"Streaming evaluation error: {e}")
+            yield _sse("error", {"detail": "Evaluation failed"})
+        finally:
+            # Stop waiting if the client went away early. The shared evaluation
+            # (singleflight) still runs to completion and its result is stored.
+            evaluation_task.cancel()
+            await _release()
+
+    return _StreamWithCleanup(
+        _events(),
+        _release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Number of submissions /winner scores at the same time
+WINNER_CONCURRENCY = int(os.getenv("WINNER_CONCURRENCY", "16"))
+
+winner_lock = asyncio.Lock()
+winner_progress = {
+    "running": False,
+    "total": 0,
+    "done": 0,
+    "failed": 0,
+    "pruned": 0,
+    "stage": None,
+    "refined": 0,
+    "started_at": None,
+}
+# Background refinement of the last staged /winner run
+refine_task: Optional[asyncio.Task] = None
+
+
 @app.post("/winner")
-async def get_winner():
-    """Evaluate only latest unscored submissions sequentially and return standings."""
-    latest_entries = get_latest_unscored_submissions()
-
-    questions = load_questions("data/test_questions.csv")
-    print("Evaluating latest unscored entries (sequential)...")
-
-    for entry in latest_entries:
-        result = await test_evaluate(entry["solution"], questions)
-        update_submission(entry["name"], entry["solution"], result["score"])
-
-    # Return the best finalScore per user
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT name, MAX(finalScore) as max_score, MAX(timestamp) as latest_timestamp
-        FROM scores
-        GROUP BY name
-        ORDER BY max_score DESC
-        """
+async def get_winner(prune: bool = False, bulk: bool = False, staged: bool = False):
+    """
+    Evaluate the latest unscored submissions in parallel and return standings.
+
+    With ``prune=true`` submissions are scored incrementally and dropped as
+    soon as they can no longer reach the podium. They are stored with the
+    correct count so far and an upper bound instead of an exact score.
+
+    With ``bulk=true`` all pending classifications are submitted as one job
+    to the bulk backend (BULK_BACKEND, the Batch API by default).
+
+    With ``staged=true`` each submission is first scored on a label-stratified
+    sample of the test set, and the standings are returned with provisional
+    scores and confidence intervals. The remaining questions are evaluated in
+    the background, replacing each provisional score with the exact one.
+    """
+    global refine_task
+    if prune + bulk + staged > 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only one of prune, bulk and staged can be used",
+        )
+
+    async with winner_lock:
+        # Submissions still being refined are unscored until the refinement is done
+        if refine_task is not None:
+            await asyncio.wait({refine_task})
+            refine_task = None
+
+        latest_entries = await get_latest_unscored_submissions()
+        questions = await asyncio.to_thread(load_questions, "data/test_questions.csv")
+        semaphore = asyncio.Semaphore(WINNER_CONCURRENCY)
+
+        winner_progress.update(
+            running=True,
+            total=len(latest_entries),
+            done=0,
+            failed=0,
+            pruned=0,
+            stage=None,
+            refined=0,
+            started_at=datetime.now().isoformat(),
+        )
+        print(f"Evaluating {len(latest_entries)} latest unscored entries (parallel)...")
+
+        async def _score(entry):
+            async with semaphore:
+                try:
+                    with model_lane(BULK, entry["name"]):
+                        result = await test_evaluate(
+                            entry["solution"], questions, name=entry["name"]
+                        )
+                    await update_submission(
+                        entry["name"],
+                        entry["solution"],
+                        result["score"],
+                        question_set_version=questions.version,
+                        usage=result["usage"],
+                    )
+                except Exception as e:
+                    winner_progress["failed"] += 1
+                    print(f"Winner evaluation error for {entry['name']}: {e}")
+                finally:
+                    winner_progress["done"] += 1
+
+        async def _on_candidate_done(candidate):
+            if candidate.pruned:
+                winner_progress["pruned"] += 1
+                print(f"Pruned {candidate.name}: at most {candidate.upper_bound}")
+            await update_submission(
+                candidate.name,
+                candidate.solution,
+                candidate.correct,
+                upper_bound=candidate.upper_bound if candidate.pruned else None,
+                question_set_version=questions.version,
+                usage=candidate.usage.as_dict(),
+            )
+            winner_progress["done"] += 1
+
+        async def _score_bulk():
+            solutions = [entry["solution"] or "" for entry in latest_entries]
+            with model_lane(BULK):
+                all_results = await evaluate_bulk(solutions, questions)
+            for entry, results in zip(latest_entries, all_results):
+                score = sum(result["correct"] for result in results.values())
+                save_evaluation_log(
+                    entry["solution"] or "", results, score, entry["name"], questions.version
+                )
+                await update_submission(
+                    entry["name"], entry["solution"], score, question_set_version=questions.version
+                )
+                winner_progress["done"] += 1
+
+        async def _sample(entry, sample: QuestionSet):
+            usage = Usage()
+            results = {}
+            async with semaphore:
+                try:
+                    with track_usage(usage), model_lane(BULK, entry["name"]):
+                        results = await evaluate_once(entry["solution"] or "", sample)
+                    estimate = estimate_score(questions, results)
+                    await save_provisional_score(
+                        entry["name"], entry["solution"], estimate.score, estimate.low, estimate.high
+                    )
+                except Exception as e:
+                    results = {}
+                    print(f"Provisional evaluation error for {entry['name']}: {e}")
+                finally:
+                    winner_progress["done"] += 1
+            return results, usage
+
+        async def _refine(entry, sample_results, usage: Usage, rest: QuestionSet):
+            solution = entry["solution"] or ""
+            async with semaphore:
+                try:
+                    with track_usage(usage), model_lane(BULK, entry["name"]):
+                        if not sample_results:
+                            results = await evaluate_once(solution, questions)
+                        elif len(rest):
+                            rest_results = await evaluate_once(solution, rest)
+                            results = merge_results(questions, sample_results, rest_results)
+                        else:
+                            results = sample_results
+                    score = sum(result["correct"] for result in results.values())
+                    save_evaluation_log(solution, results, score, entry["name"], questions.version)
+                    await update_submission(
+                        entry["name"],
+                        entry["solution"],
+                        score,
+                        question_set_version=questions.version,
+                        usage=usage.as_dict(),
+                    )
+                except Exception as e:
+                    winner_progress["failed"] += 1
+                    print(f"Winner evaluation error for {entry['name']}: {e}")
+                finally:
+                    winner_progress["refined"] += 1
+
+        async def _refine_all(sampled, rest: QuestionSet):
+            try:
+                await asyncio.gather(
+                    *(_refine(entry, results, usage, rest) for entry, (results, usage) in sampled)
+                )
+                print(f"Refined {len(sampled)} provisional scores")
+            finally:
+                winner_progress.update(running=False, stage=None)
+
+        async def _score_staged() -> asyncio.Task:
+            sample, rest = questions.stratified_split(PROVISIONAL_SAMPLE_SIZE)
+            winner_progress["stage"] = "sample"
+            sampled = await asyncio.gather(*(_sample(entry, sample) for entry in latest_entries))
+            winner_progress["stage"] = "refine"
+            return asyncio.create_task(_refine_all(list(zip(latest_entries, sampled)), rest))
+
+        refining = False
+        try:
+            if bulk:
+                await _score_bulk()
+            elif staged:
+                refine_task = await _score_staged()
+                refining = True
+            elif prune:
+                await score_with_pruning(
+                    latest_entries,
+                    questions,
+                    await get_best_final_scores(),
+                    concurrency=WINNER_CONCURRENCY,
+                    on_done=_on_candidate_done,
+                )
+            else:
+                await asyncio.gather(*(_score(entry) for entry in latest_entries))
+        finally:
+            winner_progress["running"] = refining
+
+    # Return the best finalScore per user, provisional where it is not in yet
+    return await get_final_standings()
+
+
+@app.get("/winner/progress")
+async def get_winner_progress():
+    """Progress of the current or last /winner run, the shared rate limiter and the model scheduler"""
+    return {
+        **winner_progress,
+        "rate_limiter": rate_limiter.stats(),
+        "scheduler": scheduler.stats(),
+    }
+
+
+# Question sets /analytics reports on
+ANALYTICS_QUESTION_SETS = {
+    "test": "data/test_questions.csv",
+    "check": "data/check_questions.csv",
+}
+
+
+@app.get("/analytics")
+async def get_analytics(questions: str = "test"):
+    """
+    Difficulty of each question in the current test or check set
+
+    Returns each question's accuracy, mean latency and predicted labels
+    (hardest first, with questions most solutions answer differently from
+    the expected label flagged as suspect), accuracy per label and the
+    confusion matrix. Read from running aggregates, so it is cheap to poll.
+    """
+    if questions not in ANALYTICS_QUESTION_SETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"questions must be one of {', '.join(ANALYTICS_QUESTION_SETS)}",
+        )
+    question_set = await asyncio.to_thread(load_questions, ANALYTICS_QUESTION_SETS[questions])
+    return await run_in_db_thread(get_question_analytics, question_set.version)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Evaluation pipeline metrics in the Prometheus text format"""
+    for state, count in (await job_counts()).items():
+        FINAL_EVALUATIONS_QUEUED.set(count, state=state)
+    BACKGROUND_TASKS.set(len(asyncio.all_tasks()))
+    EVALUATION_LOG_QUEUED.set(log_writer.stats()["queued"])
+    return Response(
+        content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
     )
-    rows = cursor.fetchall()
-    conn.close()
-    return [{"name": row[0], "score": row[1], "timestamp": row[2]} for row in rows]
+
+
+async def _snapshot_response(request: Request, kind: str) -> Response:
+    """Serve a cached leaderboard view, or 304 if the client's copy is current"""
+    version, body = await run_in_db_thread(snapshot_cache.get, kind)
+    etag = etag_for(kind, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/final", response_model=list[LeaderboardEntry])
-async def get_final_leaderboard():
+async def get_final_leaderboard(request: Request):
     """Return final standings by best finalScore per user."""
-    conn = sqlite3.connect("leaderboard.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT name, MAX(finalScore) as max_score, MAX(timestamp) as latest_timestamp
-        FROM scores
-        GROUP BY name
-        ORDER BY max_score DESC
-        """
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    safe_rows = []
-    for row in rows:
-        name = str(row[0] or "")
-        score = int(row[1] or 0)
-        timestamp = str(row[2] or "")
-        safe_rows.append(LeaderboardEntry(name=name, score=score, timestamp=timestamp))
-    return safe_rows
+    return await _snapshot_response(request, "final")
 
 
 @app.get("/leaderboard", response_model=list[LeaderboardEntry])
-async def get_leaderboard_route():
+async def get_leaderboard_route(request: Request):
     """Get the leaderboard data"""
-    leaderboard_data = get_leaderboard()
-    return [
-        LeaderboardEntry(
-            name=entry["name"], score=entry["score"], timestamp=entry["timestamp"]
-        )
-        for entry in leaderboard_data
-    ]
+    return await _snapshot_response(request, "leaderboard")
 
 
 @app.get("/top3", response_model=list[LeaderboardEntry])
-async def get_top_three_route():
+async def get_top_three_route(request: Request):
     """Get the top three users"""
-    top_three_data = get_top_three()
-    return [
-        LeaderboardEntry(
-            name=entry["name"], score=entry["score"], timestamp=entry["timestamp"]
+    return await _snapshot_response(request, "top3")
+
+
+@app.get("/leaderboard/stream")
+async def stream_leaderboard(view: str = "leaderboard"):
+    """
+    Stream a leaderboard view as Server-Sent Events.
+
+    Sends a ``snapshot`` event with every row on connect, then a ``delta``
+    event with the rows that are new or changed (rank included) and the
+    names that were removed whenever the standings change. Each event's id
+    is the leaderboard version; a reconnecting client gets a new snapshot.
+    """
+    if view not in BUILDERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"view must be one of {', '.join(BUILDERS)}",
         )
-        for entry in top_three_data
-    ]
+    subscriber = await broadcaster.subscribe(view)
+
+    async def _events():
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(
+                        subscriber.queue.get(), LEADERBOARD_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield b": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # For running the app directly
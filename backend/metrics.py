@@ -0,0 +1,281 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are module-level and safe to update from
+the event loop and from worker threads. ``render()`` produces the body of
+the /metrics endpoint.
+"""
+import math
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class: a named family of samples, one per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(suffix, formatted labels, value) for every sample"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label values: per-bucket (non-cumulative) counts, sum, count
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(c), s, n)) for key, (c, s, n) in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(("_bucket", _format_labels(self.labelnames, key, le), cumulative))
+            samples.append(("_sum", _format_labels(self.labelnames, key), total))
+            samples.append(("_count", _format_labels(self.labelnames, key), count))
+        return samples
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Iterable[str] = (),
+    buckets: Iterable[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format"""
+    return registry.render()
+
+
+# Model calls
+MODEL_CALL_SECONDS = histogram(
+    "model_call_duration_seconds",
+    "Latency of a single classifier backend call",
+    ["backend", "kind"],
+    (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+MODEL_CALL_ERRORS = counter(
+    "model_call_errors_total", "Classifier backend calls that raised", ["backend", "kind"]
+)
+MODEL_CALL_RETRIES = counter(
+    "model_call_retries_total", "Classifier backend calls repeated after a failed or partial answer", ["reason"]
+)
+MODEL_CALL_HEDGES = counter(
+    "model_call_hedges_total", "Duplicate requests sent for slow model calls", ["kind"]
+)
+MODEL_CIRCUIT_OPEN = counter("model_circuit_open_total", "Times the model circuit breaker opened")
+MODEL_CALLS_IN_FLIGHT = gauge("model_calls_in_flight", "Classifier backend calls currently running")
+MODEL_QUEUE_WAIT_SECONDS = histogram(
+    "model_queue_wait_seconds",
+    "Time a model call waited for a scheduler slot",
+    ["lane"],
+    (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+MODEL_QUEUE_DEPTH = gauge("model_queue_depth", "Model calls waiting for a scheduler slot", ["lane"])
+MODEL_LANE_IN_FLIGHT = gauge(
+    "model_lane_calls_in_flight", "Model calls holding a scheduler slot", ["lane"]
+)
+
+# Evaluations
+EVALUATION_SECONDS = histogram(
+    "evaluation_duration_seconds",
+    "Time to classify and score one submission",
+    ["questions"],
+    (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+EVALUATIONS_IN_PROGRESS = gauge("evaluations_in_progress", "Submissions currently being evaluated")
+EVALUATIONS_COALESCED = counter(
+    "evaluations_coalesced_total",
+    "Evaluations answered from an identical in-flight or stored evaluation",
+    ["source"],
+)
+CLASSIFICATION_FALLBACKS = counter(
+    "classification_fallbacks_total", 'Questions answered with the "?" fallback', ["reason"]
+)
+
+# Admission control on /submit
+SUBMISSIONS_ACTIVE = gauge("submissions_active", "Quick evaluations admitted and still running")
+SUBMISSIONS_REJECTED = counter(
+    "submissions_rejected_total", "Submissions turned away with 429", ["reason"]
+)
+
+# Classification cache
+CACHE_HITS = counter("classification_cache_hits_total", "Classification cache hits", ["tier"])
+CACHE_MISSES = counter("classification_cache_misses_total", "Classification cache misses")
+
+# Database
+DB_QUERY_SECONDS = histogram(
+    "db_query_duration_seconds",
+    "Time spent running a database function on the database threads",
+    ["query"],
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+# Queues and background work
+FINAL_EVALUATIONS_QUEUED = gauge(
+    "final_evaluations_queued", "Final evaluation jobs by state", ["state"]
+)
+BACKGROUND_TASKS = gauge("background_tasks", "asyncio tasks alive on the API event loop")
+EVALUATION_LOG_QUEUED = gauge("evaluation_log_queued", "Evaluation log records not yet written")
+
+# Streaming leaderboard
+LEADERBOARD_STREAM_CLIENTS = gauge(
+    "leaderboard_stream_clients", "Clients connected to the leaderboard stream", ["view"]
+)
+LEADERBOARD_DELTAS = counter(
+    "leaderboard_deltas_total", "Leaderboard deltas fanned out to stream clients", ["view"]
+)
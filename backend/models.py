@@ -32,7 +32,24 @@ class LeaderboardEntry(BaseModel):
     name: str
     score: int
     timestamp: str
+    # Set when final scoring was pruned: score is then a lower bound
+    upper_bound: Optional[int] = None
+    # Set while the final score is a sample estimate: low and high bound its interval
+    provisional: bool = False
+    low: Optional[int] = None
+    high: Optional[int] = None
 
 
 class OpenAIResponse(BaseModel):
     response: Literal["Sticos", "SupportAI", "innsiktsmodulen", "Other"]
+
+
+class PackedAnswer(BaseModel):
+    id: int
+    response: Literal["Sticos", "SupportAI", "innsiktsmodulen", "Other"]
+
+
+class OpenAIPackedResponse(BaseModel):
+    """Structured output for several questions classified in one call"""
+
+    answers: List[PackedAnswer]
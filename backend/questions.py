@@ -0,0 +1,190 @@
+import io
+import os
+import csv
+import hashlib
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+def normalize_label(label: str) -> str:
+    """Normalize labels to canonical form for comparison."""
+    if label is None:
+        return ""
+    l = label.strip().lower()
+    if l in {"mcp agent", "innsiktsmodul", "innsikt"}:
+        return "innsiktsmodulen"
+    if l in {"support ai", "support-ai", "supportai"}:
+        return "supportai"
+    return l
+
+
+def question_id(text: str) -> str:
+    """Stable id for a question, independent of its row in the CSV"""
+    return "q-" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+@dataclass(frozen=True)
+class Question:
+    """One question with its id and pre-normalized expected label"""
+
+    id: str
+    text: str
+    label: str
+
+
+class QuestionSet(Mapping):
+    """
+    Immutable, parsed question set.
+
+    Behaves as the read-only ``question -> normalized label`` mapping the
+    evaluation functions expect, and additionally carries stable question
+    ids and a ``version`` derived from the file contents.
+    """
+
+    def __init__(self, path: str, version: str, questions: Tuple[Question, ...]):
+        self.path = path
+        self.version = version
+        self.questions = questions
+        self._labels: Dict[str, str] = {q.text: q.label for q in questions}
+        self._by_id: Dict[str, Question] = {q.id: q for q in questions}
+        self._heads: Dict[int, "QuestionSet"] = {}
+        self._splits: Dict[int, Tuple["QuestionSet", "QuestionSet"]] = {}
+
+    def __getitem__(self, text: str) -> str:
+        return self._labels[text]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._labels)
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __repr__(self) -> str:
+        return f"QuestionSet({self.path!r}, version={self.version!r}, {len(self)} questions)"
+
+    def by_id(self, qid: str) -> Question:
+        return self._by_id[qid]
+
+    def head(self, n: int) -> "QuestionSet":
+        """The first n questions as their own set, built once per size"""
+        if n >= len(self.questions):
+            return self
+        if n not in self._heads:
+            self._heads[n] = QuestionSet(
+                self.path, f"{self.version}:{n}", self.questions[:n]
+            )
+        return self._heads[n]
+
+    def strata(self) -> Dict[str, Tuple[Question, ...]]:
+        """Questions grouped by expected label"""
+        groups: Dict[str, List[Question]] = {}
+        for question in self.questions:
+            groups.setdefault(question.label, []).append(question)
+        return {label: tuple(group) for label, group in groups.items()}
+
+    def stratified_split(self, n: int) -> Tuple["QuestionSet", "QuestionSet"]:
+        """
+        Split into a label-stratified sample of about n questions and the rest
+
+        Each label gets a share of the sample proportional to its share of
+        the set, but at least two questions where it has them, so every
+        stratum has a variance estimate. Questions are picked in question-id
+        order, which is a hash of the text, so the split is fixed for a given
+        version and both halves can be shared between identical solutions.
+        """
+        if n >= len(self.questions):
+            return self, QuestionSet(self.path, f"{self.version}:rest0", ())
+        if n not in self._splits:
+            strata = self.strata()
+            shares = {label: n * len(group) / len(self.questions) for label, group in strata.items()}
+            sizes = {label: int(share) for label, share in shares.items()}
+            # Hand out what rounding down left over, largest remainder first
+            for label in sorted(shares, key=lambda label: sizes[label] - shares[label])[
+                : n - sum(sizes.values())
+            ]:
+                sizes[label] += 1
+            picked = set()
+            for label, group in strata.items():
+                size = min(len(group), max(sizes[label], 2))
+                picked.update(q.id for q in sorted(group, key=lambda q: q.id)[:size])
+
+            sample = tuple(q for q in self.questions if q.id in picked)
+            rest = tuple(q for q in self.questions if q.id not in picked)
+            self._splits[n] = (
+                QuestionSet(self.path, f"{self.version}:sample{n}", sample),
+                QuestionSet(self.path, f"{self.version}:rest{n}", rest),
+            )
+        return self._splits[n]
+
+
+def parse_questions(path: str, data: bytes) -> QuestionSet:
+    """Parse a ``question;label`` CSV with a header row"""
+    labels: Dict[str, str] = {}
+    reader = csv.reader(io.StringIO(data.decode("utf-8")), delimiter=";")
+    next(reader, None)  # Skip header
+    for row in reader:
+        if len(row) >= 2:
+            labels[row[0].strip()] = normalize_label(row[1])
+
+    version = hashlib.sha256(data).hexdigest()[:12]
+    questions = tuple(
+        Question(id=question_id(text), text=text, label=label) for text, label in labels.items()
+    )
+    return QuestionSet(path, version, questions)
+
+
+class QuestionRegistry:
+    """
+    Loads each question CSV once and serves the parsed set from memory.
+
+    Every lookup stats the file. It is only re-read when its mtime or size
+    changed, and only re-parsed when the contents hash differs. The new set
+    replaces the old one in a single assignment, so readers always see a
+    complete set.
+    """
+
+    def __init__(self):
+        self._sets: Dict[str, Tuple[Tuple[float, int], QuestionSet]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> QuestionSet:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return QuestionSet(path, "missing", ())
+        signature = (stat.st_mtime, stat.st_size)
+
+        entry = self._sets.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        with self._lock:
+            entry = self._sets.get(path)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+
+            with open(path, "rb") as f:
+                data = f.read()
+            version = hashlib.sha256(data).hexdigest()[:12]
+            if entry is not None and entry[1].version == version:
+                question_set = entry[1]
+            else:
+                question_set = parse_questions(path, data)
+                print(f"Loaded {len(question_set)} questions from {path} (version {version})")
+            self._sets[path] = (signature, question_set)
+            return question_set
+
+
+registry = QuestionRegistry()
+
+
+def get_question_set(path: str) -> QuestionSet:
+    """Return the current parsed question set for a CSV file"""
+    return registry.get(path)
+
+
+def question_set_version(questions) -> Optional[str]:
+    """Version of a QuestionSet, or None for a plain dict of questions"""
+    return getattr(questions, "version", None)
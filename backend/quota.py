@@ -0,0 +1,81 @@
+import os
+import time
+import sqlite3
+from typing import Optional
+
+from db import transaction, connection
+
+# Submissions each user may make
+MAX_TRIES = int(os.getenv("MAX_TRIES", "5"))
+# Seconds a reservation is held before it is assumed lost (e.g. the process died)
+RESERVATION_SECONDS = float(os.getenv("QUOTA_RESERVATION_SECONDS", "600"))
+
+
+def reserve_try(name: str, max_tries: int = MAX_TRIES) -> Optional[int]:
+    """
+    Atomically reserve one of the user's tries before evaluating
+
+    Tries in use are the submissions already saved plus the reservations
+    still being evaluated, so concurrent submits from one user cannot both
+    take the last try. Expired reservations are dropped.
+
+    Args:
+        name: User's name
+        max_tries: Tries each user may use
+
+    Returns:
+        The number of tries used before this one, or None if none are left
+    """
+    now = time.time()
+    with transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO user_quota (name) VALUES (?)", (name,))
+        row = conn.execute(
+            """
+            UPDATE user_quota
+            SET reserved = (CASE WHEN reserved_until < :now THEN 0 ELSE reserved END) + 1,
+                reserved_until = :until
+            WHERE name = :name
+              AND used + (CASE WHEN reserved_until < :now THEN 0 ELSE reserved END) < :max_tries
+            RETURNING used
+            """,
+            {"name": name, "now": now, "until": now + RESERVATION_SECONDS, "max_tries": max_tries},
+        ).fetchone()
+    return row[0] if row else None
+
+
+def release_try(name: str):
+    """Give back a reserved try whose evaluation did not complete"""
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE user_quota SET reserved = MAX(reserved - 1, 0) WHERE name = ?", (name,)
+        )
+
+
+def consume_try(conn: sqlite3.Connection, name: str) -> int:
+    """
+    Turn the user's reservation into a used try
+
+    Must run inside the transaction that saves the submission. Works without
+    a reservation too, for scripts that save submissions directly.
+
+    Returns:
+        The number of tries used, including this one
+    """
+    conn.execute("INSERT OR IGNORE INTO user_quota (name) VALUES (?)", (name,))
+    (used,) = conn.execute(
+        """
+        UPDATE user_quota
+        SET used = used + 1, reserved = MAX(reserved - 1, 0)
+        WHERE name = ?
+        RETURNING used
+        """,
+        (name,),
+    ).fetchone()
+    return used
+
+
+def get_used_tries(name: str) -> int:
+    """Number of submissions the user has saved"""
+    with connection() as conn:
+        row = conn.execute("SELECT used FROM user_quota WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
@@ -0,0 +1,133 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from evaluate import evaluate
+from test_evaluate import save_evaluation_log
+from usage import Usage, track_usage
+from scheduler import model_lane, BULK
+
+# Places on the podium shown by /final
+PODIUM_SIZE = 3
+# Questions evaluated per step before a submission's upper bound is rechecked
+PRUNE_CHUNK_SIZE = int(os.getenv("PRUNE_CHUNK_SIZE", "16"))
+
+
+class Candidate:
+    """Running tally for one submission being scored incrementally"""
+
+    def __init__(self, name: str, solution: str, total: int):
+        self.name = name
+        self.solution = solution
+        self.total = total
+        self.correct = 0
+        self.evaluated = 0
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.pruned = False
+        self.usage = Usage()
+
+    @property
+    def upper_bound(self) -> int:
+        """Best score still reachable if every remaining question is correct"""
+        return self.correct + (self.total - self.evaluated)
+
+
+class PodiumTracker:
+    """
+    Tracks the best guaranteed score per user to decide what can be pruned.
+
+    A submission is pruned when its upper bound is strictly below the lower
+    bound of the user in last podium place among the other users, so it can
+    neither reach nor tie its way onto the podium.
+    """
+
+    def __init__(self, existing_best: Dict[str, int], podium_size: int = PODIUM_SIZE):
+        self.existing_best = dict(existing_best)
+        self.podium_size = podium_size
+        self.candidates: List[Candidate] = []
+
+    def lower_bounds(self) -> Dict[str, int]:
+        bounds = dict(self.existing_best)
+        for candidate in self.candidates:
+            bounds[candidate.name] = max(bounds.get(candidate.name, 0), candidate.correct)
+        return bounds
+
+    def threshold(self, name: str) -> Optional[int]:
+        """Last podium place among users other than ``name``, if the podium is full"""
+        others = sorted(
+            (score for user, score in self.lower_bounds().items() if user != name),
+            reverse=True,
+        )
+        if len(others) < self.podium_size:
+            return None
+        return others[self.podium_size - 1]
+
+    def can_prune(self, candidate: Candidate) -> bool:
+        threshold = self.threshold(candidate.name)
+        return threshold is not None and candidate.upper_bound < threshold
+
+
+async def score_with_pruning(
+    entries: List[Dict[str, Any]],
+    questions: Dict[str, str],
+    existing_best: Dict[str, int],
+    concurrency: int,
+    chunk_size: int = PRUNE_CHUNK_SIZE,
+    on_done: Optional[Callable[[Candidate], Awaitable[None]]] = None,
+) -> List[Candidate]:
+    """
+    Score submissions chunk by chunk, dropping those that cannot reach the podium.
+
+    Args:
+        entries: Submissions with name and solution
+        questions: The full question set
+        existing_best: Best finalScore per user already stored
+        concurrency: Chunks evaluated at the same time across all submissions
+        chunk_size: Questions per chunk
+        on_done: Awaited with each candidate once it is scored or pruned
+
+    Returns:
+        One Candidate per entry. Pruned candidates hold the correct count so
+        far in ``correct`` and the best reachable score in ``upper_bound``.
+    """
+    items = list(questions.items())
+    chunks = [
+        (offset, dict(items[offset : offset + chunk_size]))
+        for offset in range(0, len(items), chunk_size)
+    ]
+    tracker = PodiumTracker(existing_best)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _score(candidate: Candidate):
+        with track_usage() as candidate.usage, model_lane(BULK, candidate.name):
+            await _evaluate_chunks(candidate)
+
+        save_evaluation_log(
+            candidate.solution,
+            candidate.results,
+            candidate.correct,
+            candidate.name,
+            getattr(questions, "version", None),
+        )
+        if on_done is not None:
+            await on_done(candidate)
+
+    async def _evaluate_chunks(candidate: Candidate):
+        for offset, chunk in chunks:
+            if tracker.can_prune(candidate):
+                candidate.pruned = True
+                break
+            # Taking the semaphore per chunk interleaves submissions, so
+            # every tally moves forward and bounds tighten early
+            async with semaphore:
+                results = await evaluate(candidate.solution, chunk)
+            for index, result in enumerate(results.values()):
+                candidate.results[str(offset + index)] = result
+            candidate.correct += sum(result["correct"] for result in results.values())
+            candidate.evaluated += len(chunk)
+
+    for entry in entries:
+        tracker.candidates.append(Candidate(entry["name"], entry["solution"] or "", len(items)))
+
+    await asyncio.gather(*(_score(candidate) for candidate in tracker.candidates))
+    return tracker.candidates
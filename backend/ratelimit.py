@@ -0,0 +1,125 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Dict, List, Tuple
+
+# Upstream quota for the model, shared by everything in this process
+MODEL_RPM = int(os.getenv("MODEL_RPM", "5000"))
+MODEL_TPM = int(os.getenv("MODEL_TPM", "800000"))
+# Completion tokens reserved per classification (a single label in JSON)
+COMPLETION_TOKENS = 10
+
+
+def count_tokens(text: str) -> int:
+    """
+    Fast local token estimate, about four UTF-8 bytes per token.
+
+    Counting bytes rather than characters charges non-ASCII text (æ, ø, å)
+    more, as the tokenizer does.
+    """
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count of one request for rate limiting, including its completion"""
+    return sum(count_tokens(text) for text in texts) + COMPLETION_TOKENS
+
+
+class TokenBucket:
+    """Bucket holding up to ``capacity`` units, refilled continuously per minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` units are available"""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter for model calls.
+
+    Callers are served by priority and then in arrival order, so a large
+    request cannot be starved by a stream of small ones, and interactive
+    calls do not wait behind background calls when the budget runs out.
+    """
+
+    def __init__(self, rpm: int = MODEL_RPM, tpm: int = MODEL_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._turn = asyncio.Condition()
+        # (priority, arrival) of every caller waiting for budget
+        self._waiting: List[Tuple[int, int]] = []
+        self._arrivals = itertools.count()
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_wait = 0.0
+
+    async def acquire(self, tokens: int, priority: int = 0):
+        """
+        Wait until one request and ``tokens`` tokens fit in the budget
+
+        Args:
+            tokens: Estimated tokens of the request
+            priority: Lower values are served first (scheduler lane priority)
+        """
+        started = time.monotonic()
+        ticket = (priority, next(self._arrivals))
+        async with self._turn:
+            heapq.heappush(self._waiting, ticket)
+            self._turn.notify_all()
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        await self._turn.wait()
+                        continue
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if delay <= 0:
+                        break
+                    # Woken early when a caller with higher priority arrives
+                    try:
+                        await asyncio.wait_for(self._turn.wait(), delay)
+                    except TimeoutError:
+                        pass
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._turn.notify_all()
+
+            self.requests.level -= 1
+            self.tokens.level -= min(tokens, self.tokens.capacity)
+            self.total_requests += 1
+            self.total_tokens += tokens
+            self.total_wait += time.monotonic() - started
+
+    def stats(self) -> Dict[str, float]:
+        """Remaining budget and totals since start"""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return {
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level),
+            "total_requests": self.total_requests,
+            "total_tokens": self.total_tokens,
+            "total_wait_seconds": round(self.total_wait, 3),
+        }
+
+
+rate_limiter = RateLimiter()
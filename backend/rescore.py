@@ -0,0 +1,320 @@
+"""
+Offline re-scoring of stored submissions.
+
+Evaluates stored submissions against a question set and stores the result
+as their final score, e.g. after a label fix in test_questions.csv or a
+model change. Progress is checkpointed per submission, so running the same
+command again after an interruption picks up where it stopped:
+
+    python -m rescore --latest [--questions data/test_questions.csv]
+    python -m rescore --all --concurrency 8
+    python -m rescore --name alice --name bob --dry-run
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import evaluate
+from database import init_db, get_submissions, get_evaluation_result
+from async_database import update_submission
+from db import connection, transaction, run_in_db_thread
+from evallog import log_writer
+from analytics import outcome_writer
+from questions import QuestionSet
+from ratelimit import estimate_tokens, COMPLETION_TOKENS
+from scheduler import model_lane, BULK
+from singleflight import evaluation_config, solution_hash
+from test_evaluate import test_evaluate
+from usage import Usage
+
+# Submissions evaluated at the same time
+RESCORE_CONCURRENCY = int(os.getenv("RESCORE_CONCURRENCY", "4"))
+
+
+def _unfinished_run(
+    conn: sqlite3.Connection, selection: str, question_set_version: str, config: str
+) -> Optional[int]:
+    row = conn.execute(
+        """
+        SELECT id FROM rescore_runs
+        WHERE selection = ? AND question_set_version = ? AND config = ? AND finished_at IS NULL
+        ORDER BY id DESC LIMIT 1
+        """,
+        (selection, question_set_version, config),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def find_run(selection: str, question_set_version: str, config: str) -> Optional[int]:
+    """The unfinished run for the same selection, question set and model settings, if any"""
+    with connection() as conn:
+        return _unfinished_run(conn, selection, question_set_version, config)
+
+
+def start_run(
+    selection: str, question_set_version: str, config: str, submissions: List[Dict[str, Any]]
+) -> Tuple[int, bool]:
+    """
+    Resume the matching unfinished run, or record a new one with its submissions
+
+    The submissions of a new run are fixed when it starts, so a resumed run
+    works through the same list even if users submitted in the meantime.
+
+    Returns:
+        (run id, whether an existing run was resumed)
+    """
+    now = datetime.now().isoformat()
+    with transaction() as conn:
+        run_id = _unfinished_run(conn, selection, question_set_version, config)
+        if run_id is not None:
+            return run_id, True
+
+        run_id = conn.execute(
+            """
+            INSERT INTO rescore_runs (selection, question_set_version, config, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (selection, question_set_version, config, now),
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO rescore_items (run_id, score_id, name, solution) VALUES (?, ?, ?, ?)",
+            [(run_id, item["id"], item["name"], item["solution"]) for item in submissions],
+        )
+        return run_id, False
+
+
+def run_progress(run_id: int) -> Tuple[int, int]:
+    """(submissions done, submissions in the run)"""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT COUNT(final_score), COUNT(*) FROM rescore_items WHERE run_id = ?", (run_id,)
+        ).fetchone()
+    return row[0], row[1]
+
+
+def pending_items(run_id: int) -> List[Dict[str, Any]]:
+    """Submissions of the run that have not been re-scored yet"""
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT score_id, name, solution FROM rescore_items
+            WHERE run_id = ? AND final_score IS NULL
+            ORDER BY score_id
+            """,
+            (run_id,),
+        ).fetchall()
+    return [{"id": row[0], "name": row[1], "solution": row[2]} for row in rows]
+
+
+def complete_item(run_id: int, score_id: int, final_score: int):
+    """Checkpoint one re-scored submission"""
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE rescore_items SET final_score = ?, updated_at = ?
+            WHERE run_id = ? AND score_id = ?
+            """,
+            (final_score, datetime.now().isoformat(), run_id, score_id),
+        )
+
+
+def finish_run(run_id: int):
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE rescore_runs SET finished_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), run_id),
+        )
+
+
+def select_submissions(latest_only: bool, names: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """
+    Submissions to re-score, one per distinct (user, solution)
+
+    update_submission writes every row with the same user and solution, so
+    evaluating repeats of a solution again would not change anything.
+    """
+    unique: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+    for submission in get_submissions(latest_only=latest_only, names=names):
+        unique[(submission["name"], submission["solution"])] = submission
+    return sorted(unique.values(), key=lambda submission: submission["id"])
+
+
+def estimate_cost(items: List[Dict[str, Any]], questions: QuestionSet) -> Dict[str, Any]:
+    """
+    Model calls, tokens and cost a run over ``items`` would need at most
+
+    Solutions with a stored evaluation for this question set and model are
+    free, and identical solutions are only evaluated once. Answers in the
+    per-question classification cache are not subtracted.
+    """
+    texts = evaluate.question_list(questions)
+    pack_size = max(1, evaluate.EVAL_PACK_SIZE)
+    packs = [texts[start : start + pack_size] for start in range(0, len(texts), pack_size)]
+    config = evaluation_config()
+
+    usage = Usage()
+    solutions = {item["solution"] or "" for item in items}
+    stored = 0
+    for solution in solutions:
+        if get_evaluation_result(questions.version, solution_hash(solution), config) is not None:
+            stored += 1
+            continue
+        for pack in packs:
+            prompt = estimate_tokens(solution, *pack) - COMPLETION_TOKENS
+            usage.add(prompt, COMPLETION_TOKENS * len(pack))
+
+    return {
+        "submissions": len(items),
+        "distinct_solutions": len(solutions),
+        "stored_evaluations": stored,
+        **usage.as_dict(),
+    }
+
+
+async def rescore(run_id: int, questions: QuestionSet, concurrency: int = RESCORE_CONCURRENCY):
+    """
+    Re-score the pending submissions of a run and checkpoint each one
+
+    A submission with any question left unanswered is not checkpointed, so
+    the next run tries it again.
+
+    Returns:
+        Number of submissions that could not be re-scored
+    """
+    items = await run_in_db_thread(pending_items, run_id)
+    done, total = await run_in_db_thread(run_progress, run_id)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+    finished = 0
+    failed = 0
+
+    async def _rescore(item: Dict[str, Any]):
+        nonlocal done, finished, failed
+        async with semaphore:
+            try:
+                with model_lane(BULK, item["name"]):
+                    result = await test_evaluate(
+                        item["solution"] or "", questions, name=item["name"]
+                    )
+                unanswered = sum(
+                    answer["classification"] == "?" for answer in result["results"].values()
+                )
+                if unanswered:
+                    raise RuntimeError(f"{unanswered} questions unanswered")
+                await update_submission(
+                    item["name"],
+                    item["solution"],
+                    result["score"],
+                    question_set_version=questions.version,
+                    usage=result["usage"],
+                )
+                await run_in_db_thread(complete_item, run_id, item["id"], result["score"])
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{total}] {item['name']} (submission {item['id']}) failed: {e}")
+                return
+
+        done += 1
+        finished += 1
+        elapsed = time.perf_counter() - started
+        remaining = elapsed / finished * (len(items) - finished - failed)
+        print(
+            f"[{done}/{total}] {item['name']} (submission {item['id']}): "
+            f"{result['score']}/{len(questions)}, about {remaining:.0f}s left"
+        )
+
+    await asyncio.gather(*(_rescore(item) for item in items))
+    if done == total:
+        await run_in_db_thread(finish_run, run_id)
+    return failed
+
+
+async def _main(args) -> int:
+    questions = await asyncio.to_thread(evaluate.load_questions, args.questions)
+    if not len(questions):
+        print(f"No questions in {args.questions}")
+        return 1
+
+    if args.all:
+        selection = "all"
+    elif args.name:
+        selection = "names:" + ",".join(sorted(args.name))
+    else:
+        selection = "latest"
+    latest_only = args.latest or not (args.all or args.name)
+    config = evaluation_config()
+
+    run_id = await run_in_db_thread(find_run, selection, questions.version, config)
+    if args.dry_run:
+        if run_id is not None:
+            items = await run_in_db_thread(pending_items, run_id)
+            print(f"Run {run_id} would be resumed")
+        else:
+            items = await run_in_db_thread(select_submissions, latest_only, args.name)
+        estimate = await run_in_db_thread(estimate_cost, items, questions)
+        print(
+            f"Would re-score {estimate['submissions']} submissions against {len(questions)} "
+            f"questions (version {questions.version}, {config}): "
+            f"{estimate['distinct_solutions']} distinct solutions, "
+            f"{estimate['stored_evaluations']} already evaluated"
+        )
+        print(
+            f"At most {estimate['requests']} model calls, {estimate['prompt_tokens']} prompt and "
+            f"{estimate['completion_tokens']} completion tokens, about ${estimate['cost_usd']:.2f}"
+        )
+        return 0
+
+    submissions = await run_in_db_thread(select_submissions, latest_only, args.name)
+    run_id, resumed = await run_in_db_thread(
+        start_run, selection, questions.version, config, submissions
+    )
+    done, total = await run_in_db_thread(run_progress, run_id)
+    print(
+        f"{'Resuming' if resumed else 'Starting'} run {run_id}: {done} of {total} submissions "
+        f"done, question set {questions.version}, {config}"
+    )
+    try:
+        failed = await rescore(run_id, questions, args.concurrency)
+    finally:
+        await evaluate.close_backends()
+        await asyncio.to_thread(log_writer.close)
+        await asyncio.to_thread(outcome_writer.close)
+
+    done, total = await run_in_db_thread(run_progress, run_id)
+    print(f"Run {run_id}: {done} of {total} submissions re-scored, {failed} failed")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored submissions")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--all", action="store_true", help="Every stored submission")
+    selection.add_argument(
+        "--latest", action="store_true", help="Each user's latest submission (the default)"
+    )
+    selection.add_argument("--name", action="append", help="Submissions by this user (repeatable)")
+    parser.add_argument("--questions", default="data/test_questions.csv", help="Question set CSV")
+    parser.add_argument("--model", default=evaluate.MODEL, help="Model to score with")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=RESCORE_CONCURRENCY,
+        help="Submissions evaluated at the same time",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Estimate model calls and cost, change nothing"
+    )
+    args = parser.parse_args()
+
+    # Set before the backend is built and the evaluation settings are read
+    evaluate.MODEL = args.model
+    init_db()
+    raise SystemExit(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
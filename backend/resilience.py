@@ -0,0 +1,230 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from metrics import MODEL_CALL_RETRIES, MODEL_CALL_HEDGES, MODEL_CIRCUIT_OPEN
+
+# Attempts per model call, including the first
+RETRY_ATTEMPTS = int(os.getenv("MODEL_RETRY_ATTEMPTS", "3"))
+# Backoff before retry n is uniform in [0, min(max, base * 2**n)] seconds
+RETRY_BASE_DELAY = float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("MODEL_RETRY_MAX_DELAY", "8"))
+# The circuit opens when at least this share of the recent calls failed
+BREAKER_FAILURE_RATIO = float(os.getenv("MODEL_BREAKER_FAILURE_RATIO", "0.5"))
+# Recent calls considered, and the fewest needed before the circuit can open
+BREAKER_WINDOW = int(os.getenv("MODEL_BREAKER_WINDOW", "50"))
+BREAKER_MIN_CALLS = int(os.getenv("MODEL_BREAKER_MIN_CALLS", "20"))
+# Seconds the circuit stays open before a trial call is let through
+BREAKER_RESET_SECONDS = float(os.getenv("MODEL_BREAKER_RESET_SECONDS", "15"))
+# Send a duplicate request when a call runs past this latency percentile
+HEDGE_ENABLED = os.getenv("MODEL_HEDGE", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "0.95"))
+# Latencies needed before hedging starts, and the shortest hedge delay
+HEDGE_MIN_SAMPLES = 50
+HEDGE_MIN_DELAY = 0.05
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Model circuit is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for a while.
+
+    When ``failure_ratio`` of the last ``window`` calls failed, the circuit
+    opens and calls fail fast with CircuitOpenError. After ``reset_seconds``
+    one trial call is let through while other callers wait for it; its
+    success closes the circuit again and its failure keeps it open for
+    another period.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = BREAKER_FAILURE_RATIO,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+    ):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.reset_seconds = reset_seconds
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.opened_at: Optional[float] = None
+        self._trial: Optional[asyncio.Event] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    async def before_call(self):
+        """Raise CircuitOpenError if the call may not go out now"""
+        # Calls arriving while the trial runs wait for its outcome
+        while self._trial is not None:
+            await self._trial.wait()
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(self.opened_at + self.reset_seconds - time.monotonic())
+        if state == "half-open":
+            self._trial = asyncio.Event()
+
+    def _end_trial(self):
+        if self._trial is not None:
+            self._trial.set()
+            self._trial = None
+
+    def release(self):
+        """Forget a call that was cancelled before it succeeded or failed"""
+        self._end_trial()
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print("Model circuit closed")
+        self.opened_at = None
+        self.outcomes.append(True)
+        self._end_trial()
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        failures = self.outcomes.count(False)
+        tripped = (
+            len(self.outcomes) >= self.min_calls
+            and failures >= self.failure_ratio * len(self.outcomes)
+        )
+        if self._trial is not None or (self.opened_at is None and tripped):
+            if self.opened_at is None:
+                MODEL_CIRCUIT_OPEN.inc()
+                print(f"Model circuit opened: {failures} of the last {len(self.outcomes)} calls failed")
+            self.opened_at = time.monotonic()
+            self.outcomes.clear()
+        self._end_trial()
+
+
+class LatencyTracker:
+    """Recent call latencies, to decide when a call is slow enough to hedge"""
+
+    def __init__(self, window: int = 500):
+        self._samples: Dict[str, Deque[float]] = {}
+        self.window = window
+
+    def record(self, kind: str, latency: float):
+        self._samples.setdefault(kind, deque(maxlen=self.window)).append(latency)
+
+    def percentile(self, kind: str, fraction: float) -> Optional[float]:
+        samples = self._samples.get(kind)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+breaker = CircuitBreaker()
+latencies = LatencyTracker()
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server, or the open circuit, asked us to wait"""
+    if isinstance(error, CircuitOpenError):
+        return error.retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After"""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+    return max(delay, retry_after(error) or 0.0)
+
+
+async def _hedged(call: Callable[[], Awaitable[Any]], kind: str) -> Any:
+    """Run ``call``; if it is slower than usual, race it against a duplicate"""
+    threshold = latencies.percentile(kind, HEDGE_PERCENTILE) if HEDGE_ENABLED else None
+    first = asyncio.ensure_future(call())
+    if threshold is None:
+        return await first
+
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=max(threshold, HEDGE_MIN_DELAY))
+        if done:
+            return first.result()
+
+        MODEL_CALL_HEDGES.inc(kind=kind)
+        pending.add(asyncio.ensure_future(call()))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                return succeeded[0].result()
+            error = next(iter(done)).exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_retries(
+    call: Callable[[], Awaitable[Any]],
+    kind: str,
+    retryable: Callable[[Exception], bool] = lambda error: True,
+    attempts: int = RETRY_ATTEMPTS,
+) -> Any:
+    """
+    Call the model with retries, the circuit breaker and optional hedging
+
+    Args:
+        call: Starts one model request; called again for every attempt or hedge
+        kind: Kind of call, for latency tracking and metrics
+        retryable: Whether an error is worth another attempt and counts against the circuit
+        attempts: Attempts including the first
+
+    Returns:
+        The result of the first successful attempt; the last error is raised
+        when all attempts fail
+    """
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        try:
+            # Fails fast while the circuit is open; the wait counts as an attempt
+            await breaker.before_call()
+            try:
+                result = await _hedged(call, kind)
+            except Exception as error:
+                # A request the API rejected outright says nothing about its
+                # health, so one user's bad prompt cannot open the circuit
+                if retryable(error):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+        except Exception as error:
+            if attempt == attempts - 1:
+                raise
+            if not isinstance(error, CircuitOpenError) and not retryable(error):
+                raise
+            MODEL_CALL_RETRIES.inc(reason=type(error).__name__)
+            await asyncio.sleep(backoff_delay(attempt, error))
+            continue
+        breaker.record_success()
+        latencies.record(kind, time.perf_counter() - started)
+        return result
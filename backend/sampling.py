@@ -0,0 +1,94 @@
+import os
+import math
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Any, Dict
+
+from questions import QuestionSet
+
+# Questions in the label-stratified sample behind a provisional score
+PROVISIONAL_SAMPLE_SIZE = int(os.getenv("PROVISIONAL_SAMPLE_SIZE", "60"))
+# Coverage of the interval published with a provisional score
+PROVISIONAL_CONFIDENCE = float(os.getenv("PROVISIONAL_CONFIDENCE", "0.95"))
+
+
+@dataclass(frozen=True)
+class Estimate:
+    """Provisional score on the full set, with a confidence interval"""
+
+    score: int
+    low: int
+    high: int
+
+
+def estimate_score(
+    questions: QuestionSet,
+    results: Dict[str, Dict[str, Any]],
+    confidence: float = PROVISIONAL_CONFIDENCE,
+) -> Estimate:
+    """
+    Estimate the full-set score from the results on a stratified sample
+
+    Each label's accuracy in the sample is scaled up to that label's
+    question count (the stratified estimator). The interval uses the normal
+    approximation with the finite population correction, and each stratum's
+    accuracy is shrunk towards 1/2 for the variance, so a stratum answered
+    all right or all wrong still contributes some uncertainty. The interval
+    never leaves what the sample already guarantees.
+
+    Args:
+        questions: The full question set the sample was drawn from
+        results: Per-question results on the sample, as from evaluate.evaluate
+        confidence: Coverage of the interval
+
+    Returns:
+        The rounded estimate and interval, in correct answers out of len(questions)
+    """
+    sampled: Dict[str, int] = {}
+    correct: Dict[str, int] = {}
+    for result in results.values():
+        label = questions[result["question"]]
+        sampled[label] = sampled.get(label, 0) + 1
+        correct[label] = correct.get(label, 0) + bool(result["correct"])
+
+    estimate = 0.0
+    variance = 0.0
+    for label, group in questions.strata().items():
+        population = len(group)
+        n = sampled.get(label, 0)
+        if n == 0:
+            # Not sampled: anything from none to all of it may be right
+            estimate += population / 2
+            variance += (population / 2) ** 2
+            continue
+        estimate += population * correct[label] / n
+        shrunk = (correct[label] + 1) / (n + 2)
+        spread = shrunk * (1 - shrunk) * n / (n - 1) if n > 1 else 0.25
+        variance += population**2 * (1 - n / population) * spread / n
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    margin = z * math.sqrt(variance)
+    floor = sum(correct.values())
+    ceiling = floor + len(questions) - sum(sampled.values())
+    return Estimate(
+        score=min(ceiling, max(floor, round(estimate))),
+        low=max(floor, math.floor(estimate - margin)),
+        high=min(ceiling, math.ceil(estimate + margin)),
+    )
+
+
+def merge_results(
+    questions: QuestionSet, *parts: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Combine results on disjoint parts of a question set into one result dict
+
+    Keys are renumbered to each question's position in the full set, as if
+    the whole set had been evaluated in one go.
+    """
+    positions = {text: index for index, text in enumerate(questions)}
+    merged = {}
+    for part in parts:
+        for result in part.values():
+            merged[positions[result["question"]]] = result
+    return {str(index): merged[index] for index in sorted(merged)}
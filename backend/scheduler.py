@@ -0,0 +1,202 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from metrics import MODEL_QUEUE_WAIT_SECONDS, MODEL_QUEUE_DEPTH, MODEL_LANE_IN_FLIGHT
+
+# Model calls in flight at once in this process, across all lanes
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "128"))
+
+# Lanes from highest to lowest priority, with the share of MODEL_CONCURRENCY
+# reserved for each. Quick checks from /submit, final evaluations, and
+# /winner or offline re-scoring.
+INTERACTIVE = "interactive"
+FINAL = "final"
+BULK = "bulk"
+LANE_SHARES = {
+    INTERACTIVE: float(os.getenv("LANE_SHARE_INTERACTIVE", "0.5")),
+    FINAL: float(os.getenv("LANE_SHARE_FINAL", "0.3")),
+    BULK: float(os.getenv("LANE_SHARE_BULK", "0.2")),
+}
+
+# Lane and user that model calls made by the running task are charged to
+current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("current_lane", default=FINAL)
+current_user: contextvars.ContextVar[str] = contextvars.ContextVar("current_user", default="")
+
+
+@contextmanager
+def model_lane(lane: str, user: Optional[str] = None) -> Iterator[None]:
+    """Charge the model calls made inside the block (and tasks it starts) to a lane and user"""
+    lane_token = current_lane.set(lane)
+    user_token = current_user.set(user if user is not None else current_user.get())
+    try:
+        yield
+    finally:
+        current_user.reset(user_token)
+        current_lane.reset(lane_token)
+
+
+def lane_priority(lane: Optional[str] = None) -> int:
+    """0 for the highest-priority lane; the current lane by default"""
+    return list(LANE_SHARES).index(lane or current_lane.get())
+
+
+class Lane:
+    """Waiting calls of one lane, ordered by weighted fair queuing across users"""
+
+    def __init__(self, name: str, priority: int, reserved: int):
+        self.name = name
+        self.priority = priority
+        self.reserved = reserved
+        self.in_flight = 0
+        # Calls queued and not yet granted or abandoned
+        self.waiting = 0
+        # (finish tag, arrival, future); abandoned calls are skipped when popped
+        self.queue: List[Tuple[float, int, asyncio.Future]] = []
+        self.virtual_time = 0.0
+        self.finish: Dict[str, float] = {}
+
+    def push(self, user: str, arrival: int, future: asyncio.Future):
+        # Each user's calls are spaced one unit apart in virtual time, so a
+        # user with many queued calls only gets every n-th slot among n users
+        tag = max(self.virtual_time, self.finish.get(user, 0.0)) + 1.0
+        self.finish[user] = tag
+        self.waiting += 1
+        heapq.heappush(self.queue, (tag, arrival, future))
+
+    def abandon(self):
+        """A queued call was cancelled before it got a slot"""
+        self.waiting -= 1
+
+    def pop(self) -> Optional[asyncio.Future]:
+        while self.queue:
+            tag, _, future = heapq.heappop(self.queue)
+            if future.cancelled():
+                continue
+            self.waiting -= 1
+            self.virtual_time = tag
+            if not self.queue:
+                # Idle again: start the next busy period with a clean slate
+                self.finish.clear()
+            return future
+        self.finish.clear()
+        return None
+
+
+class ModelScheduler:
+    """
+    Admits model calls in priority order, fairly between users.
+
+    Each lane has ``share * capacity`` slots reserved. A lane may always
+    use its own reservation, and beyond that any free slot not held back
+    for another lane: the interactive reservation is always held back from
+    the lower lanes, so quick checks never queue behind background work,
+    while the final lane's is only held back while final calls are waiting.
+    Background lanes therefore soak up whatever capacity interactive
+    traffic leaves over. Within a lane, waiting calls are served by
+    weighted fair queuing across users, so one user's evaluation cannot
+    push everyone else's to the back. Only used from the event loop.
+    """
+
+    def __init__(self, capacity: int = MODEL_CONCURRENCY, shares: Dict[str, float] = LANE_SHARES):
+        self.capacity = max(1, capacity)
+        self.lanes = {
+            name: Lane(name, priority, int(share * self.capacity))
+            for priority, (name, share) in enumerate(shares.items())
+        }
+        self.in_flight = 0
+        self._arrivals = itertools.count()
+
+    def _held_back(self, lane: Lane) -> int:
+        """Free slots lane may not take because they are reserved for other lanes"""
+        held = 0
+        for other in self.lanes.values():
+            if other is lane:
+                continue
+            if other.priority < lane.priority or other.waiting:
+                held += max(0, other.reserved - other.in_flight)
+        return held
+
+    def _can_start(self, lane: Lane) -> bool:
+        free = self.capacity - self.in_flight
+        if free <= 0:
+            return False
+        return lane.in_flight < lane.reserved or free > self._held_back(lane)
+
+    def _start(self, lane: Lane):
+        self.in_flight += 1
+        lane.in_flight += 1
+        MODEL_LANE_IN_FLIGHT.set(lane.in_flight, lane=lane.name)
+
+    def _dispatch(self):
+        """Hand free slots to waiting calls, highest-priority lane first"""
+        progress = True
+        while progress:
+            progress = False
+            for lane in self.lanes.values():
+                if lane.waiting and self._can_start(lane):
+                    future = lane.pop()
+                    if future is None:
+                        continue
+                    self._start(lane)
+                    future.set_result(None)
+                    progress = True
+                    break
+        for lane in self.lanes.values():
+            MODEL_QUEUE_DEPTH.set(lane.waiting, lane=lane.name)
+
+    def _release(self, lane: Lane):
+        self.in_flight -= 1
+        lane.in_flight -= 1
+        MODEL_LANE_IN_FLIGHT.set(lane.in_flight, lane=lane.name)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, lane: Optional[str] = None, user: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        Hold one model-call slot for the duration of the block
+
+        Args:
+            lane: Lane to charge (default the current_lane context)
+            user: User to charge within the lane (default the current_user context)
+        """
+        queue = self.lanes[lane or current_lane.get()]
+        started = time.perf_counter()
+        if not queue.waiting and self._can_start(queue):
+            self._start(queue)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            queue.push(user if user is not None else current_user.get(), next(self._arrivals), future)
+            MODEL_QUEUE_DEPTH.set(queue.waiting, lane=queue.name)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted just as the caller went away
+                    self._release(queue)
+                else:
+                    future.cancel()
+                    queue.abandon()
+                    MODEL_QUEUE_DEPTH.set(queue.waiting, lane=queue.name)
+                raise
+        MODEL_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, lane=queue.name)
+
+        try:
+            yield
+        finally:
+            self._release(queue)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """In-flight and waiting calls and reserved slots per lane"""
+        return {
+            name: {"in_flight": lane.in_flight, "waiting": lane.waiting, "reserved": lane.reserved}
+            for name, lane in self.lanes.items()
+        }
+
+
+scheduler = ModelScheduler()
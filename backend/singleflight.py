@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import evaluate as evaluation
+from async_database import get_evaluation_result, save_evaluation_result
+from metrics import EVALUATIONS_COALESCED
+from questions import question_set_version
+from scheduler import LANE_SHARES, current_lane
+
+ResultCallback = Callable[[str, Dict[str, Any]], None]
+
+
+def solution_hash(solution: str) -> str:
+    """Content hash of a solution text"""
+    return hashlib.sha256(solution.encode("utf-8")).hexdigest()
+
+
+def evaluation_config() -> str:
+    """Backend and model settings that change answers; stored results are only reused when they match"""
+    return (
+        f"{evaluation.backend_name()}:{evaluation.MODEL}:t{evaluation.TEMPERATURE}"
+        f":s{evaluation.SEED}:p{evaluation.EVAL_PACK_SIZE}"
+    )
+
+
+class Flight:
+    """One in-flight evaluation, shared by every caller with the same key"""
+
+    def __init__(self, lane: str):
+        # Scheduler lane the shared evaluation's model calls are charged to
+        self.lane = lane
+        self.task: Optional[asyncio.Task] = None
+        self.seen: List[Tuple[str, Dict[str, Any]]] = []
+        self.listeners: List[ResultCallback] = []
+
+    def publish(self, key: str, result: Dict[str, Any]):
+        self.seen.append((key, result))
+        for listener in list(self.listeners):
+            listener(key, result)
+
+    def subscribe(self, on_result: Optional[ResultCallback]):
+        """Replay the results so far to a late joiner, then send it the rest live"""
+        if on_result is None:
+            return
+        for key, result in self.seen:
+            on_result(key, result)
+        self.listeners.append(on_result)
+
+    def unsubscribe(self, on_result: Optional[ResultCallback]):
+        if on_result in self.listeners:
+            self.listeners.remove(on_result)
+
+
+# Keyed by (evaluation key, lane)
+_flights: Dict[Tuple[Tuple[str, str, str], str], Flight] = {}
+
+
+def _find_flight(key: Tuple[str, str, str], lane: str) -> Optional[Flight]:
+    """
+    A running flight for ``key`` in ``lane`` or a higher-priority lane
+
+    A caller never joins a flight in a lower lane, so a quick check does
+    not wait at bulk priority behind /winner or the worker; it starts its
+    own flight in its own lane instead.
+    """
+    for candidate in LANE_SHARES:
+        flight = _flights.get((key, candidate))
+        if flight is not None:
+            return flight
+        if candidate == lane:
+            return None
+    return None
+
+
+def _complete(results: Dict[str, Dict[str, Any]]) -> bool:
+    return bool(results) and all(result["classification"] != "?" for result in results.values())
+
+
+async def _run(
+    key: Tuple[str, str, str], flight: Flight, system_prompt: str, questions
+) -> Dict[str, Dict[str, Any]]:
+    try:
+        results = await evaluation.evaluate(system_prompt, questions, flight.publish)
+        # Partial results are not stored, so a later identical solution gets a clean run
+        if _complete(results):
+            score = sum(result["correct"] for result in results.values())
+            await save_evaluation_result(*key, score, results)
+        return results
+    finally:
+        _flights.pop((key, flight.lane), None)
+
+
+async def evaluate_once(
+    system_prompt: str, questions, on_result: Optional[ResultCallback] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate a solution, sharing the work between identical requests
+
+    Requests are keyed by (question-set version, solution hash, model
+    settings). A stored result for the key is returned straight away;
+    otherwise concurrent identical requests wait on one evaluation, as long
+    as it runs in their scheduler lane or a higher-priority one. The shared
+    evaluation keeps running when one of its callers goes away.
+    Question sets without a version are evaluated directly.
+
+    Args:
+        system_prompt: The solution text
+        questions: The questions to evaluate against
+        on_result: Called with (key, result) as each question is scored
+
+    Returns:
+        The per-question results, as from evaluate.evaluate
+    """
+    version = question_set_version(questions)
+    if version is None:
+        return await evaluation.evaluate(system_prompt, questions, on_result)
+
+    key = (version, solution_hash(system_prompt), evaluation_config())
+    lane = current_lane.get()
+    flight = _find_flight(key, lane)
+    if flight is None:
+        stored = await get_evaluation_result(*key)
+        if stored is not None:
+            EVALUATIONS_COALESCED.inc(source="stored")
+            if on_result is not None:
+                for result_key, result in stored.items():
+                    on_result(result_key, result)
+            return stored
+
+        # Another request may have started the same evaluation during the lookup
+        flight = _find_flight(key, lane)
+
+    if flight is None:
+        flight = Flight(lane)
+        _flights[(key, lane)] = flight
+        flight.subscribe(on_result)
+        flight.task = asyncio.create_task(_run(key, flight, system_prompt, questions))
+    else:
+        EVALUATIONS_COALESCED.inc(source="in_flight")
+        flight.subscribe(on_result)
+
+    try:
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.unsubscribe(on_result)
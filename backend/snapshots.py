@@ -0,0 +1,92 @@
+import json
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from database import get_leaderboard, get_top_three, get_final_standings, get_leaderboard_version
+from models import LeaderboardEntry
+
+
+def _leaderboard() -> List[Dict[str, Any]]:
+    return [
+        LeaderboardEntry(
+            name=entry["name"], score=entry["score"], timestamp=entry["timestamp"]
+        ).model_dump()
+        for entry in get_leaderboard()
+    ]
+
+
+def _top_three() -> List[Dict[str, Any]]:
+    return [
+        LeaderboardEntry(
+            name=entry["name"], score=entry["score"], timestamp=entry["timestamp"]
+        ).model_dump()
+        for entry in get_top_three()
+    ]
+
+
+def _final() -> List[Dict[str, Any]]:
+    safe_rows = []
+    for entry in get_final_standings():
+        name = str(entry["name"] or "")
+        score = int(entry["score"] or 0)
+        timestamp = str(entry["timestamp"] or "")
+        safe_rows.append(
+            LeaderboardEntry(
+                name=name,
+                score=score,
+                timestamp=timestamp,
+                upper_bound=entry["upper_bound"],
+                provisional=entry["provisional"],
+                low=entry["low"],
+                high=entry["high"],
+            ).model_dump()
+        )
+    return safe_rows
+
+
+BUILDERS: Dict[str, Callable[[], List[Dict[str, Any]]]] = {
+    "leaderboard": _leaderboard,
+    "top3": _top_three,
+    "final": _final,
+}
+
+
+class SnapshotCache:
+    """
+    Encoded leaderboard responses, rebuilt only when the leaderboard changes.
+
+    Every write to scores bumps the leaderboard version in the same
+    transaction, including writes from worker processes, so a single-row
+    version read tells whether a cached body is still current.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, Tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str) -> Tuple[int, bytes]:
+        """Return (version, JSON body) for a leaderboard view"""
+        version = get_leaderboard_version()
+        cached = self._snapshots.get(kind)
+        if cached is not None and cached[0] == version:
+            return cached
+
+        with self._lock:
+            cached = self._snapshots.get(kind)
+            if cached is not None and cached[0] == version:
+                return cached
+            # Read after the version, so the body is at least that fresh
+            body = json.dumps(BUILDERS[kind](), ensure_ascii=False).encode("utf-8")
+            self._snapshots[kind] = (version, body)
+            return version, body
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+snapshot_cache = SnapshotCache()
+
+
+def etag_for(kind: str, version: int) -> str:
+    return f'W/"{kind}-{version}"'
@@ -1,25 +1,35 @@
-import csv
-import os
-import json
 import asyncio
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, Optional
 
-from evaluate import evaluate, load_questions
+from evaluate import load_questions
+from evallog import log_writer, make_record
+from analytics import outcome_writer, make_outcomes
+from singleflight import evaluate_once
+from database import init_db
+from usage import track_usage
 
 
-async def test_evaluate(freetext: str, questions) -> Dict[str, Any]:
+async def test_evaluate(
+    freetext: str,
+    questions,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    name: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     Test the evaluate function against expected results from CSV.
 
     Args:
         freetext: The free text to evaluate
         questions: The questions to evaluate against
+        on_result: Called with (key, result) as each question is scored
+        name: The user the evaluation belongs to, for the evaluation log
 
     Returns:
         A dictionary with evaluation results and test results
     """
-    # Get evaluation results from OpenAI (or fallback)
-    eval_results = await evaluate(freetext, questions)
+    # Get evaluation results from OpenAI (or fallback), shared with identical submissions
+    with track_usage() as usage:
+        eval_results = await evaluate_once(freetext, questions, on_result)
 
     score = sum(result["correct"] for result in eval_results.values())
     test_results = [question["question"] for question in eval_results.values()]
@@ -28,48 +38,40 @@ async def test_evaluate(freetext: str, questions) -> Dict[str, Any]:
     total_questions = len(eval_results)
     tmp_score = (score / total_questions * 100) if total_questions > 0 else 0
     
-    await save_evaluation_log(freetext, eval_results, score)
+    save_evaluation_log(
+        freetext, eval_results, score, name, getattr(questions, "version", None)
+    )
 
     return {
         "score": score,
         "tmp_score": tmp_score,
         "results": eval_results,
         "test_details": test_results,
+        "usage": usage.as_dict(),
     }
 
 
-async def save_evaluation_log(
+def save_evaluation_log(
     freetext: str,
     results: Dict[str, Any],
     score: int,
+    name: Optional[str] = None,
+    question_set_version: Optional[str] = None,
 ) -> None:
     """
-    Save the evaluation details to a log file for debugging.
+    Queue the evaluation details for the evaluation log, and the
+    per-question outcomes for the question analytics.
 
     Args:
         freetext: The user's input text
         results: The evaluation results
         score: The final score (1-5)
+        name: The user the evaluation belongs to
+        question_set_version: Version of the questions evaluated against
     """
-    os.makedirs("logs", exist_ok=True)
-
-    # Create a timestamp for the log file
-    from datetime import datetime
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    log_data = {
-        "timestamp": timestamp,
-        "input_text": (
-            freetext[:500] + "..." if len(freetext) > 500 else freetext
-        ),  # Truncate long inputs
-        "score": score,
-        "results": results,
-    }
-
-    # Write to a JSON file
-    with open(f"logs/evaluation_{timestamp}.json", "w", encoding="utf-8") as f:
-        json.dump(log_data, f, indent=2, ensure_ascii=False)
+    log_writer.write(make_record(freetext, results, score, name, question_set_version))
+    if question_set_version is not None:
+        outcome_writer.write(make_outcomes(results, name, question_set_version))
 
 
 if __name__ == "__main__":
@@ -82,6 +84,7 @@ if __name__ == "__main__":
     Mva på konto uten avdeling krever spesifikk momsbehandling.
     """
     questions = load_questions("data/check_questions.csv")
+    init_db()
 
     # Run the async function in an event loop
     results = asyncio.run(test_evaluate(sample_text, questions))
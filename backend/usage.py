@@ -0,0 +1,67 @@
+import os
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# USD per million tokens; the defaults are gpt-4o list prices
+INPUT_PRICE = float(os.getenv("MODEL_INPUT_PRICE", "2.50"))
+CACHED_INPUT_PRICE = float(os.getenv("MODEL_CACHED_INPUT_PRICE", "1.25"))
+OUTPUT_PRICE = float(os.getenv("MODEL_OUTPUT_PRICE", "10.00"))
+
+
+class Usage:
+    """Token usage and cost of the model calls made for one evaluation"""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+
+    @property
+    def cost_usd(self) -> float:
+        uncached = self.prompt_tokens - self.cached_tokens
+        return (
+            uncached * INPUT_PRICE
+            + self.cached_tokens * CACHED_INPUT_PRICE
+            + self.completion_tokens * OUTPUT_PRICE
+        ) / 1_000_000
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+# The evaluation the running task is working for; tasks it starts inherit it
+current_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar(
+    "current_usage", default=None
+)
+
+
+def record_usage(prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+    """Add one model call to the current evaluation's usage, if one is being tracked"""
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens, cached_tokens)
+
+
+@contextmanager
+def track_usage(usage: Optional[Usage] = None) -> Iterator[Usage]:
+    """Collect the usage of every model call made inside the block, into usage if given"""
+    usage = usage if usage is not None else Usage()
+    token = current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_usage.reset(token)
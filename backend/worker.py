@@ -0,0 +1,130 @@
+"""
+Final evaluation worker.
+
+Claims queued jobs from the eval_jobs table and scores each submission
+against the full test set. Several worker processes can run side by side:
+
+    python -m worker [--concurrency 2]
+"""
+import os
+import signal
+import socket
+import asyncio
+import argparse
+
+from database import init_db
+from evaluate import load_questions, close_backends
+from test_evaluate import test_evaluate
+from jobs import LEASE_SECONDS
+from evallog import log_writer
+from analytics import outcome_writer
+from scheduler import model_lane, FINAL
+from async_database import update_submission, claim_job, renew_lease, complete_job, fail_job
+
+# Seconds to wait before polling again when the queue is empty
+POLL_INTERVAL = 1.0
+
+
+async def _keep_lease(job_id: int, worker_id: str):
+    """Renew the lease at a third of its length while the job runs"""
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        if not await renew_lease(job_id, worker_id):
+            print(f"Lost lease on job {job_id}")
+            return
+
+
+async def run_job(job: dict, worker_id: str):
+    """Run a single final evaluation and record the result"""
+    heartbeat = asyncio.create_task(_keep_lease(job["id"], worker_id))
+    try:
+        test_questions = await asyncio.to_thread(load_questions, "data/test_questions.csv")
+        with model_lane(FINAL, job["name"]):
+            final_eval = await test_evaluate(
+                job["solution"] or "", test_questions, name=job["name"]
+            )
+        # Fallback answers mean the model was unavailable: retry instead of storing a low score
+        unanswered = sum(
+            result["classification"] == "?" for result in final_eval["results"].values()
+        )
+        if unanswered:
+            raise RuntimeError(f"{unanswered} questions unanswered")
+        await update_submission(
+            job["name"],
+            job["solution"] or "",
+            final_eval["score"],
+            question_set_version=test_questions.version,
+            usage=final_eval["usage"],
+            submission_id=job["submission_id"],
+        )
+        await complete_job(job["id"], worker_id, final_eval["score"])
+        print(f"Job {job['id']} for {job['name']}: final score {final_eval['score']}")
+    except Exception as e:
+        print(f"Job {job['id']} failed (attempt {job['attempts']}): {e}")
+        await fail_job(job["id"], worker_id, str(e))
+    finally:
+        heartbeat.cancel()
+
+
+async def run_worker(concurrency: int = 1, once: bool = False):
+    """
+    Claim and run jobs until stopped
+
+    Args:
+        concurrency: Number of jobs this process runs at the same time
+        once: Exit when the queue is empty instead of polling
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            pass
+
+    running: set[asyncio.Task] = set()
+    print(f"Worker {worker_id} started (concurrency {concurrency})")
+
+    while not stopping.is_set():
+        job = await claim_job(worker_id) if len(running) < concurrency else None
+        if job is not None:
+            task = asyncio.create_task(run_job(job, worker_id))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            continue
+
+        if once and not running:
+            break
+
+        # Wake up when a slot frees, on shutdown, or to poll the queue again
+        stop_wait = asyncio.create_task(stopping.wait())
+        await asyncio.wait(
+            running | {stop_wait},
+            timeout=POLL_INTERVAL,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        stop_wait.cancel()
+
+    # Let in-flight jobs finish; anything interrupted is reclaimed when its lease expires
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+    await close_backends()
+    await asyncio.to_thread(log_writer.close)
+    await asyncio.to_thread(outcome_writer.close)
+    print(f"Worker {worker_id} stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run final evaluation jobs")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("WORKER_CONCURRENCY", "2")),
+        help="Jobs to run at the same time in this process",
+    )
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    init_db()
+    asyncio.run(run_worker(args.concurrency, args.once))
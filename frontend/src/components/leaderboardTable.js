@@ -29,7 +29,18 @@ const LeaderboardTable = ({ leaderboard }) => {
               <tr key={index} className={index < 3 ? "bg-yellow-50" : ""}>
                 <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">#{index + 1}</td>
                 <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-800 font-medium">{entry.name}</td>
-                <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-800 font-semibold">{entry.score}</td>
+                <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-800 font-semibold">
+                  {entry.provisional ? (
+                    <span title="Estimated from a sample; the exact score is being calculated">
+                      ~{entry.score}{' '}
+                      <span className="text-xs font-normal text-gray-500">
+                        ({entry.low}–{entry.high})
+                      </span>
+                    </span>
+                  ) : (
+                    entry.score
+                  )}
+                </td>
                 <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
                   {formatDate(entry.timestamp)}
                 </td>
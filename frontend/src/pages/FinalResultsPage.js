@@ -1,46 +1,32 @@
-import React, { useEffect, useState, useRef } from 'react';
+import React, { useEffect, useState } from 'react';
 import LoadingSpinner from '../components/loadingSpinner';
 import LeaderboardTable from '../components/leaderboardTable';
 import Podium from '../components/Podium';
-import { getFinalLeaderboard } from '../services/api';
+import { subscribeLeaderboard } from '../services/api';
 
 const FinalResultsPage = () => {
   const [leaderboard, setLeaderboard] = useState([]);
   const [top3, setTop3] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
-  const pollRef = useRef(null);
 
   useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const data = await getFinalLeaderboard();
-        const arr = Array.isArray(data) ? data : [];
+    // Provisional scores are replaced as the server pushes the exact ones
+    return subscribeLeaderboard(
+      'final',
+      (data) => {
         // Show only when there are actual final scores computed
-        const scored = arr.filter((e) => (e?.score || 0) > 0);
+        const scored = data.filter((e) => (e?.score || 0) > 0);
         setLeaderboard(scored);
         setTop3(scored.slice(0, 3));
         setError(null);
-        if (scored.length === 0 && !pollRef.current) {
-          pollRef.current = setInterval(fetchData, 5000);
-        }
-        if (scored.length > 0 && pollRef.current) {
-          clearInterval(pollRef.current);
-          pollRef.current = null;
-        }
-      } catch (err) {
+        setLoading(false);
+      },
+      (err) => {
         setError(err.message);
-      } finally {
         setLoading(false);
       }
-    };
-    fetchData();
-    return () => {
-      if (pollRef.current) {
-        clearInterval(pollRef.current);
-        pollRef.current = null;
-      }
-    };
+    );
   }, []);
 
   if (loading) {
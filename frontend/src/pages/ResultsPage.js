@@ -1,6 +1,6 @@
 // src/pages/ResultsPage.js
 import React, { useState, useEffect } from 'react';
-import { getLeaderboard } from '../services/api';
+import { subscribeLeaderboard } from '../services/api';
 import { getMockLeaderboard } from '../utils/helpers';
 import LoadingSpinner from '../components/loadingSpinner';
 import LeaderboardTable from '../components/leaderboardTable';
@@ -12,26 +12,23 @@ const ResultsPage = () => {
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    const fetchData = async () => {
-      try {
-        setLoading(true);
-        
-        const leaderboardData = await getLeaderboard();
+    let received = false;
+
+    // The server pushes the board on connect and again whenever it changes
+    return subscribeLeaderboard(
+      'leaderboard',
+      (leaderboardData) => {
+        received = true;
         setLeaderboard(leaderboardData);
         setError(null);
-      } catch (err) {
+        setLoading(false);
+      },
+      (err) => {
         setError(err.message);
-        setLeaderboard(getMockLeaderboard());
-      } finally {
+        if (!received) setLeaderboard(getMockLeaderboard());
         setLoading(false);
       }
-    };
-
-    fetchData();
-    
-    // Poll for updates every 30 seconds
-    const interval = setInterval(fetchData, 30000);
-    return () => clearInterval(interval);
+    );
   }, []);
 
   if (loading) {
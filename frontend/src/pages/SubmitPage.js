@@ -4,7 +4,7 @@ import { useAuth } from '../context/AuthContext';
 import Header from '../components/Header';
 import TestItem from '../components/TestItem';
 import LoadingSpinner from '../components/loadingSpinner';
-import { submitSolution } from '../services/api';
+import { submitSolutionStream } from '../services/api';
 import chatImage from '../images/chat.png'; // Import the image
 
 const SubmitPage = () => {
@@ -80,13 +80,15 @@ const SubmitPage = () => {
     setError(null);
 
     try {
-      const response = await submitSolution(auth.name, auth.password, solution);
-      if (response.status === 401) {
-        logout();
-        navigate('/');
-        return;
-      }
-      setFeedback(response);
+      // Show each result as soon as it is classified
+      setFeedback({ results: {} });
+      const summary = await submitSolutionStream(auth.name, auth.password, solution, (result) => {
+        setFeedback((prev) => ({
+          ...prev,
+          results: { ...(prev && prev.results), [result.key]: result },
+        }));
+      });
+      setFeedback((prev) => ({ ...prev, ...summary }));
     } catch (error) {
       console.error(error);
       setError(error.message || 'Submission failed');
@@ -189,13 +191,13 @@ const SubmitPage = () => {
             <div className="mb-4">
               <span className="font-semibold">Your Score: </span>
               <span className={`font-medium text-lg ${feedback && feedback.score > 3 ? 'text-green-600' : 'text-amber-600'}`}>
-                {feedback ? `${feedback.score}/${testItems.length}` : 'N/A'}
+                {feedback && feedback.score !== undefined ? `${feedback.score}/${testItems.length}` : 'N/A'}
               </span>
             </div>
             <div className="mb-4">
               <span className="font-semibold">Number of Tries: </span>
               <span className="font-medium text-lg text-gray-800">
-                {feedback ? `${feedback.num_uses}/5` : 'N/A'}
+                {feedback && feedback.num_uses !== undefined ? `${feedback.num_uses}/5` : 'N/A'}
               </span>
             </div>
             <div className="mb-6 overflow-x-auto sm:rounded-lg">
@@ -33,6 +33,56 @@ export const submitSolution = async (name, password, solution) => {
   return await response.json();
 };
 
+export const submitSolutionStream = async (name, password, solution, onResult) => {
+  const response = await fetch(`${API_URL}/submit/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ name, solution }),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.detail || 'Submission failed');
+  }
+
+  // Parse Server-Sent Events from the response body as they arrive
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const chunk = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      chunk.split('\n').forEach((line) => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+
+      const payload = JSON.parse(data);
+      if (event === 'result') onResult(payload);
+      else if (event === 'summary') summary = payload;
+      else if (event === 'error') throw new Error(payload.detail || 'Submission failed');
+    }
+  }
+
+  if (!summary) {
+    throw new Error('Submission ended unexpectedly');
+  }
+  return summary;
+};
+
 export const getLeaderboard = async () => {
   const response = await fetch(`${API_URL}/leaderboard`);
   
@@ -59,4 +109,37 @@ export const getFinalLeaderboard = async () => {
     throw new Error('Failed to fetch final leaderboard');
   }
   return await response.json();
+};
+
+// Follow a leaderboard view ('leaderboard', 'top3' or 'final') as it changes.
+// The server sends every row on connect and then only the rows that changed;
+// onRows gets the full, ordered list after each update. EventSource
+// reconnects by itself and is sent a fresh snapshot. Returns a function that
+// closes the stream.
+export const subscribeLeaderboard = (view, onRows, onError) => {
+  const source = new EventSource(`${API_URL}/leaderboard/stream?view=${view}`);
+  let rows = new Map();
+
+  const publish = () => {
+    onRows([...rows.values()].sort((a, b) => a.rank - b.rank));
+  };
+
+  source.addEventListener('snapshot', (event) => {
+    const payload = JSON.parse(event.data);
+    rows = new Map(payload.rows.map((row) => [row.name, row]));
+    publish();
+  });
+
+  source.addEventListener('delta', (event) => {
+    const payload = JSON.parse(event.data);
+    payload.removed.forEach((name) => rows.delete(name));
+    payload.changed.forEach((row) => rows.set(row.name, row));
+    publish();
+  });
+
+  source.onerror = () => {
+    if (onError) onError(new Error('Lost connection to the leaderboard, reconnecting'));
+  };
+
+  return () => source.close();
 };
\ No newline at end of file